@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# Benchmark of every stage of the analysis (load and read cache, trim, summary statistics, ANOVA, Tukey, chart rendering) on synthetic
+# experiment files of growing size, compared with stored baseline timings to find regressions.
+# Timings depend on the machine, so no baseline is shipped: run with --save-baseline once on the machine that is used for
+# comparing (before the changes to measure), later runs are compared with it and fail when a stage got slower.
+# The synthetic files have exactly the structure of the experiment files: producers that start a few seconds apart, per
+# second throughput counts and average latencies per producer, total_throughput and average_latency.
+# The statistics of the air quality data sent by the producers (shared/concentration-statistics.js) are used as hints
+# for realistic spread (coefficient of variation) and missing values (probability of a measurement).
+
+hints_file_name: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared", "concentration-statistics.js")
+baseline_file_name: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark-baseline.json")
+sizes: list[tuple] = [(5, 1200), (16, 3600), (50, 1200), (64, 14400)]  # (producers, seconds) of the synthetic files, 50x1200 times Tukey with many groups
+
+
+def concentration_hints(file_name: str = hints_file_name) -> dict[str, dict]:
+    # Reads the numbers of every pollutant from the JavaScript module, e.g. {"pm25": {"probability": 0.93, "mean": 58.78, ...}}
+    with open(file_name) as file:
+        source = file.read()
+    total_observations = float(re.search(r"totalObservations\s*=\s*(\d+)", source).group(1))
+    hints: dict[str, dict] = {}
+    for name, body in re.findall(r"(\w+):\s*\{([^}]*)\}", source):
+        hint: dict = {}
+        for key, value in re.findall(r"(\w+):\s*([^,\n]+)", body):
+            value = value.strip()
+            hint[key] = float(value.split("/")[0]) / total_observations if "totalObservations" in value else float(value)
+        hints[name] = hint
+    return hints
+
+
+def generate_experiment(file_name: str, producers: int, seconds: int, sparsity: float = None, seed: int = 0) -> None:
+    """Writes a synthetic experiment .csv file with producers producer columns and seconds rows.
+    sparsity is the probability that a producer has no measurement in a second (default from the concentration hints)."""
+    rng = np.random.default_rng(seed)
+    hints = list(concentration_hints().values())
+    if sparsity is None:
+        sparsity = 1 - float(np.mean([hint["probability"] for hint in hints]))
+    variation = float(np.median([hint["std"] / hint["mean"] for hint in hints]))  # Spread of the measurements relative to their mean
+
+    # Producers start during the first seconds, have a lower throughput and higher latency until the consumer is ready
+    starts = np.sort(rng.integers(0, max(seconds // 100, 1), producers))
+    rows = np.arange(seconds)[:, np.newaxis]
+    warm_up = 1 - 0.5 * np.exp(-(rows - starts) / 10)
+    sigma = np.sqrt(np.log(1 + (variation / 8) ** 2))  # Throughput per second varies much less than a single measurement
+    throughput = np.round(50_000 / np.sqrt(producers) * warm_up * rng.lognormal(-sigma ** 2 / 2, sigma, (seconds, producers)))
+    latency = 20 * producers / warm_up * rng.lognormal(-(sigma * 4) ** 2 / 2, sigma * 4, (seconds, producers))
+
+    missing = (rows < starts) | (rng.random((seconds, producers)) < sparsity)
+    throughput[missing] = np.nan
+    latency[missing] = np.nan
+
+    names: list[str] = sorted(f"producer-service-{index}" for index in range(1, producers + 1))  # Same (string) order as the real files
+    data: dict = {"time": pd.date_range("2021-05-06T17:03:20Z", periods=seconds, freq="s").strftime("%Y-%m-%dT%H:%M:%S.000Z")}
+    for index, name in enumerate(names):
+        data[f"{name}_throughput"] = pd.array(throughput[:, index], dtype="Int64")
+    data["total_throughput"] = np.nansum(throughput, axis=1).astype(np.int64)
+    for index, name in enumerate(names):
+        data[f"{name}_latency"] = latency[:, index]
+    with np.errstate(invalid="ignore"):
+        data["average_latency"] = np.nansum(latency, axis=1) / (~missing).sum(axis=1)  # Empty when no producer has a measurement
+    pd.DataFrame(data).to_csv(file_name, index=False)
+
+
+def time_stages(file_name: str, producers: int, seconds: int, folder: str, sparsity: float = None) -> dict[str, float]:
+    # The stages are imported here so the generator can be used without the analysis dependencies
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import loader
+    from decimate import figure_pixels, min_max_decimate
+    from streaming import RunningStats, one_way_anova, trim_series
+    from tukey import tukey_hsd
+
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+    generate_experiment(file_name, producers, seconds, sparsity)
+    timings["generate"] = time.perf_counter() - start
+
+    loader._runs.clear()
+    start = time.perf_counter()
+    run = loader.load_run(file_name)
+    run.load(run.columns)  # Parses the .csv file and writes the cache
+    timings["load"] = time.perf_counter() - start
+
+    loader._runs.clear()
+    start = time.perf_counter()
+    run = loader.load_run(file_name)
+    data = run.load(run.columns)  # Every later run of the analysis reads the cache written above
+    timings["read cache"] = time.perf_counter() - start
+
+    columns: list[str] = [column for column in run.columns if column.endswith("_throughput") and column != "total_throughput"]
+    start = time.perf_counter()
+    trimmed = [trim_series(data[column], 20, 20) for column in columns + ["total_throughput"]]
+    timings["trim"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    summaries = [RunningStats.from_values(series) for series in trimmed]
+    timings["summary"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    one_way_anova(summaries[:-1])
+    timings["anova"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tukey_hsd(columns, summaries[:-1])
+    timings["tukey"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fig_width_cm, dpi = 40.0, 150
+    plt.figure(figsize=(fig_width_cm / 2.54, 20.0 / 2.54))
+    for series in trimmed:
+        x, y = min_max_decimate(np.arange(1, len(series) + 1), series, figure_pixels(fig_width_cm, dpi))
+        plt.plot(x, y, linewidth="2")
+    plt.savefig(os.path.join(folder, "line.png"), bbox_inches="tight", dpi=dpi)
+    plt.close()
+    timings["chart"] = time.perf_counter() - start
+    return timings
+
+
+def size_key(producers: int, seconds: int, sparsity: float = None) -> str:
+    # Timings of a sparsity other than the default one are kept apart in the baseline
+    return f"{producers}x{seconds}" if sparsity is None else f"{producers}x{seconds}@{sparsity:g}"
+
+
+def run_benchmark(in_sizes: list[tuple], repeat: int = 3, sparsity: float = None) -> dict[str, dict]:
+    """The best time of repeat runs of every stage for every size, keyed on "<producers>x<seconds>" ("@<sparsity>" added when given)."""
+    results: dict[str, dict] = {}
+    folder = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        for producers, seconds in in_sizes:
+            best: dict[str, float] = {}
+            for repetition in range(repeat):
+                file_name = os.path.join(folder, f"Synthetic-{producers}-{seconds}-{repetition}.csv")
+                for stage, seconds_taken in time_stages(file_name, producers, seconds, folder, sparsity).items():
+                    best[stage] = min(best.get(stage, np.inf), seconds_taken)
+            results[size_key(producers, seconds, sparsity)] = best
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    # Prints a table of every stage and gives the stages that are more than tolerance slower than their baseline,
+    # stages without a baseline cannot be flagged and are listed after the table
+    regressions: list[str] = []
+    unchecked: list[str] = []
+    print(f"{'size':>10} {'stage':>10} {'seconds':>10} {'baseline':>10} {'ratio':>7}")
+    for size, timings in results.items():
+        for stage, seconds_taken in timings.items():
+            reference = baseline.get(size, {}).get(stage)
+            ratio = seconds_taken / reference if reference else np.nan
+            flag = ""
+            if not reference:
+                unchecked.append(f"{size}/{stage}")
+            elif ratio > 1 + tolerance:
+                flag = " REGRESSION"
+                regressions.append(f"{size} {stage}")
+            print(f"{size:>10} {stage:>10} {seconds_taken:10.4f} {reference if reference else float('nan'):10.4f} {ratio:7.2f}{flag}")
+    for entry in unchecked if baseline else []:  # Without any baseline this has already been said once
+        print(f"Warning: no baseline for {entry}, it cannot be checked for regressions (run with --save-baseline first)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every stage of the analysis on synthetic experiment files and compare with a baseline")
+    parser.add_argument("--sizes", nargs="+", default=[f"{producers}x{seconds}" for producers, seconds in sizes], help="producers x seconds, e.g. 16x3600")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sparsity", type=float, help="Probability that a producer has no measurement in a second (default from the concentration hints)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown relative to the baseline (0.25 is 25%%)")
+    parser.add_argument("--baseline", help=f"Baseline .json file, must exist unless --save-baseline is given (default {baseline_file_name}, may be missing)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these timings as the new baseline")
+    parser.add_argument("--generate", metavar="FILE", help="Only write a synthetic file of the first size and exit")
+    arguments = parser.parse_args()
+    selected_sizes: list[tuple] = [tuple(int(part) for part in size.split("x")) for size in arguments.sizes]
+
+    if arguments.generate:
+        generate_experiment(arguments.generate, *selected_sizes[0], arguments.sparsity)
+        sys.exit(0)
+
+    baseline_path: str = arguments.baseline or baseline_file_name
+    if arguments.baseline and not arguments.save_baseline and not os.path.exists(arguments.baseline):
+        sys.exit(f"Baseline {arguments.baseline} does not exist, create it with --save-baseline first")
+
+    benchmark_results = run_benchmark(selected_sizes, arguments.repeat, arguments.sparsity)
+    stored_baseline: dict = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as baseline_file:
+            stored_baseline = json.load(baseline_file)
+    else:
+        print(f"No baseline at {baseline_path}, nothing can be flagged as a regression (run with --save-baseline first)")
+    regressed: list[str] = compare(benchmark_results, stored_baseline, arguments.tolerance)
+
+    if arguments.save_baseline:
+        with open(baseline_path, "w") as baseline_file:
+            json.dump({**stored_baseline, **benchmark_results}, baseline_file, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    elif regressed:
+        print(f"Slower than the baseline: {', '.join(regressed)}")
+        sys.exit(1)
@@ -0,0 +1,191 @@
+import argparse
+import fnmatch
+import glob
+import os
+import re
+import sqlite3
+
+# Catalogue of every experiment file in the data folders with summary statistics per run in a SQLite database.
+# Broker, number of producers and consumers, duration and experiment number are parsed from the file names
+# (<broker>-<producers>-<consumers>-<minutes>-Experiment_<n>.csv or <broker>-<producers>-<minutes>-Pilotstudie.csv).
+# Updating only summarises files that are new or changed (size/mtime, then content hash), so questions over hundreds of
+# runs such as "mean throughput of Kafka runs with at least 8 producers" are indexed queries instead of reloading .csv files.
+
+database_file_name: str = "./data/catalogue.sqlite"
+data_folders: str = "./data/*/"
+columns: list[str] = ["total_throughput", "average_latency"]  # The columns summarised for every run
+remove_tail: int = 20  # The number of values removed from the beginning of every run before summarising
+remove_head: int = 20  # The number of values removed from the end of every run before summarising
+
+file_name_pattern = re.compile(
+    r"^(?P<broker>[A-Za-z]+)-(?P<producers>\d+)-(?:(?P<consumers>\d+)-(?P<minutes>\d+)-Experiment_(?P<experiment>\d+)|(?P<pilot_minutes>\d+)-Pilotstudie)$"
+)
+
+schema: str = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    dataset TEXT NOT NULL,
+    broker TEXT NOT NULL,
+    producers INTEGER NOT NULL,
+    consumers INTEGER,
+    minutes INTEGER,
+    experiment INTEGER,
+    pilot INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_broker_producers ON runs (broker, producers);
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    column_name TEXT NOT NULL,
+    remove_tail INTEGER NOT NULL,
+    remove_head INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL,
+    m2 REAL,
+    min REAL,
+    max REAL,
+    PRIMARY KEY (column_name, remove_tail, remove_head, run_id)
+);
+CREATE VIEW IF NOT EXISTS run_summaries AS
+    SELECT runs.*, column_name, remove_tail, remove_head, count, mean, m2, min, max,
+        CASE WHEN count > 1 THEN sqrt(m2 / (count - 1)) END AS std
+    FROM runs JOIN summaries ON summaries.run_id = runs.id;
+"""
+
+
+def parse_file_name(file_name: str) -> dict:
+    """Run parameters from the name of an experiment file, None when the name does not follow the naming scheme."""
+    match = file_name_pattern.match(os.path.splitext(os.path.basename(file_name))[0])
+    if match is None:
+        return None
+    pilot: bool = match["pilot_minutes"] is not None
+    return dict(
+        broker=match["broker"],
+        producers=int(match["producers"]),
+        consumers=None if pilot else int(match["consumers"]),
+        minutes=int(match["pilot_minutes"] if pilot else match["minutes"]),
+        experiment=None if pilot else int(match["experiment"]),
+        pilot=int(pilot),
+    )
+
+
+def connect(file_name: str = database_file_name) -> sqlite3.Connection:
+    connection = sqlite3.connect(file_name)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.create_function("sqrt", 1, lambda value: None if value is None or value < 0 else value ** 0.5)
+    connection.executescript(schema)
+    return connection
+
+
+def update(connection: sqlite3.Connection, pattern: str = data_folders, in_columns: list[str] = None, in_remove_tail: int = remove_tail, in_remove_head: int = remove_head) -> dict:
+    """Adds new runs, summarises new or changed runs and removes runs whose files are gone. Gives the number of each."""
+    from npz_cache import file_hash
+    from streaming import summarise_column
+
+    in_columns = in_columns or columns
+    counts: dict = dict(added=0, changed=0, unchanged=0, removed=0, skipped=0)
+    seen: set = set()
+    for file_name in sorted(glob.glob(os.path.join(pattern, "*.csv"))):
+        parameters = parse_file_name(file_name)
+        if parameters is None:
+            counts["skipped"] += 1
+            continue
+        path = os.path.abspath(file_name)
+        seen.add(path)
+        stat = os.stat(path)
+        row = connection.execute("SELECT id, size, mtime_ns, hash FROM runs WHERE path = ?", (path,)).fetchone()
+
+        if row is not None and (row["size"], row["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            run_id = row["id"]
+            counts["unchanged"] += 1
+        else:
+            content_hash = file_hash(path)
+            values = dict(path=path, dataset=os.path.basename(os.path.dirname(path)), **parameters, size=stat.st_size, mtime_ns=stat.st_mtime_ns, hash=content_hash)
+            if row is None:
+                run_id = connection.execute(f"INSERT INTO runs ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})", list(values.values())).lastrowid
+                counts["added"] += 1
+            else:
+                run_id = row["id"]
+                connection.execute(f"UPDATE runs SET {', '.join(f'{key} = ?' for key in values)} WHERE id = ?", [*values.values(), run_id])
+                if row["hash"] == content_hash:
+                    counts["unchanged"] += 1  # Only touched
+                else:
+                    connection.execute("DELETE FROM summaries WHERE run_id = ?", (run_id,))
+                    counts["changed"] += 1
+
+        # Summaries that are missing for this run (new or changed run, or columns/trims not asked for before)
+        stored: set = {entry["column_name"] for entry in connection.execute(
+            "SELECT column_name FROM summaries WHERE run_id = ? AND remove_tail = ? AND remove_head = ?", (run_id, in_remove_tail, in_remove_head))}
+        for column in in_columns:
+            if column in stored:
+                continue
+            _, summary = summarise_column(path, column, in_remove_tail, in_remove_head)
+            connection.execute(
+                "INSERT INTO summaries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, column, in_remove_tail, in_remove_head, summary.count, summary.mean, summary.m2, summary.min if summary.count else None, summary.max if summary.count else None),
+            )
+
+    for row in connection.execute("SELECT id, path FROM runs").fetchall():
+        if row["path"] not in seen and fnmatch.fnmatch(row["path"], os.path.join(os.path.abspath(pattern), "*.csv")):
+            connection.execute("DELETE FROM runs WHERE id = ?", (row["id"],))
+            counts["removed"] += 1
+    connection.commit()
+    return counts
+
+
+def find_runs(connection: sqlite3.Connection, column: str, broker: str = None, min_producers: int = None, max_producers: int = None, pilot: bool = None,
+              in_remove_tail: int = remove_tail, in_remove_head: int = remove_head) -> list[sqlite3.Row]:
+    """Summaries of column of every run that matches, ordered by broker and number of producers."""
+    conditions: list[str] = ["column_name = ?", "remove_tail = ?", "remove_head = ?"]
+    parameters: list = [column, in_remove_tail, in_remove_head]
+    for condition, value in (("broker = ?", broker), ("producers >= ?", min_producers), ("producers <= ?", max_producers), ("pilot = ?", None if pilot is None else int(pilot))):
+        if value is not None:
+            conditions.append(condition)
+            parameters.append(value)
+    return connection.execute(f"SELECT * FROM run_summaries WHERE {' AND '.join(conditions)} ORDER BY broker, producers, experiment", parameters).fetchall()
+
+
+def pooled_summary(rows: list[sqlite3.Row]):
+    # All measurements of the runs as one group, merged from the stored summaries
+    from streaming import RunningStats
+
+    pooled = RunningStats()
+    for row in rows:
+        summary = RunningStats()
+        summary.count, summary.mean, summary.m2 = row["count"], row["mean"] or 0.0, row["m2"] or 0.0
+        summary.min, summary.max = row["min"], row["max"]
+        pooled.merge(summary)
+    return pooled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catalogue of experiment runs with indexed summary statistics")
+    parser.add_argument("--database", default=database_file_name)
+    parser.add_argument("--remove-tail", type=int, default=remove_tail)
+    parser.add_argument("--remove-head", type=int, default=remove_head)
+    commands = parser.add_subparsers(dest="command", required=True)
+    update_parser = commands.add_parser("update", help="Add and summarise new or changed experiment files")
+    update_parser.add_argument("--folders", default=data_folders, help="Glob of the folders with experiment files")
+    query_parser = commands.add_parser("query", help="Summaries of the runs that match")
+    query_parser.add_argument("--column", default=columns[0])
+    query_parser.add_argument("--broker")
+    query_parser.add_argument("--min-producers", type=int)
+    query_parser.add_argument("--max-producers", type=int)
+    query_parser.add_argument("--pilot", type=int, choices=[0, 1])
+    arguments = parser.parse_args()
+
+    with connect(arguments.database) as database:
+        if arguments.command == "update":
+            print(", ".join(f"{count} {state}" for state, count in update(database, arguments.folders, columns, arguments.remove_tail, arguments.remove_head).items()))
+        else:
+            found = find_runs(database, arguments.column, arguments.broker, arguments.min_producers, arguments.max_producers,
+                              None if arguments.pilot is None else bool(arguments.pilot), arguments.remove_tail, arguments.remove_head)
+            for run in found:
+                print(f"{run['broker']:<10} {run['producers']:>3} producers {os.path.basename(run['path']):<34} mean {run['mean']:14.4f} std {run['std'] or 0:12.4f} count {run['count']}")
+            if found:
+                pooled = pooled_summary(found)
+                print(f"{len(found)} runs, mean of run means {sum(run['mean'] for run in found) / len(found):.4f}, pooled mean {pooled.mean:.4f} std {pooled.std():.4f}")
@@ -0,0 +1,147 @@
+import argparse
+import os
+import sys
+
+# Command line entry point for quick questions about experiment files, e.g.
+#   python cli.py summary data/study/*.csv --metric latency
+#   python cli.py anova data/study/Kafka-*.csv --remove-tail 20 --remove-head 20
+# Every subcommand only imports what it needs: summary reads the .npz caches with numpy alone, the statistical tests
+# import scipy and the charts matplotlib. Files, metric and trims are arguments instead of settings in the scripts.
+
+
+def metric_column(arguments: argparse.Namespace) -> str:
+    if arguments.column:
+        return arguments.column
+    return "total_throughput" if arguments.metric == "throughput" else "average_latency"
+
+
+def run_label(file_name: str) -> str:
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+def cached_values(file_name: str, column: str, remove_tail: int, remove_head: int):
+    # The trimmed values of a column, from the cache when it matches the file and through loader (pandas) otherwise
+    import numpy as np
+    from npz_cache import cache_matches, read_columns
+
+    if cache_matches(file_name):
+        values = read_columns(file_name, [column])[column].astype(np.float64)
+    else:
+        from loader import load_run
+        values = load_run(file_name).series(column).to_numpy(dtype=np.float64)
+    return values[remove_tail:len(values) - remove_head]
+
+
+def load_summaries(arguments: argparse.Namespace) -> list:
+    from streaming import summarise_column
+    return [summarise_column(file_name, metric_column(arguments), arguments.remove_tail, arguments.remove_head)[1] for file_name in arguments.files]
+
+
+def summary(arguments: argparse.Namespace) -> None:
+    import numpy as np
+    from scipy.special import stdtrit
+
+    column: str = metric_column(arguments)
+    width: int = max(len("file"), *map(len, map(run_label, arguments.files)))
+    print(f"{'file':<{width}} {'count':>7} {'mean':>14} {'std':>14} {'sem':>12} {'ci':>12} {'min':>14} {'max':>14}")
+    for file_name in arguments.files:
+        values = cached_values(file_name, column, arguments.remove_tail, arguments.remove_head)
+        values = values[~np.isnan(values)]
+        count = len(values)
+        std = values.std(ddof=1) if count > 1 else np.nan
+        sem = std / np.sqrt(count) if count > 0 else np.nan
+        ci = sem * stdtrit(count - 1, (1 + arguments.confidence) / 2.) if count > 1 else np.nan
+        print(f"{run_label(file_name):<{width}} {count:7d} {values.mean() if count else np.nan:14.4f} {std:14.4f} {sem:12.4f} {ci:12.4f} "
+              f"{values.min() if count else np.nan:14.4f} {values.max() if count else np.nan:14.4f}")
+
+
+def anova(arguments: argparse.Namespace) -> None:
+    from streaming import one_way_anova
+
+    if len(arguments.files) < 2:
+        sys.exit("ANOVA test requires at least 2 files")
+    fvalue, pvalue = one_way_anova(load_summaries(arguments))
+    print(f"F-statistic {fvalue} p-value {pvalue}")
+    print("The means are different" if pvalue < 1 - arguments.confidence else "No difference in means")
+
+
+def tukey(arguments: argparse.Namespace) -> None:
+    from tukey import save_tukey, tukey_hsd, tukey_table
+
+    if len(arguments.files) < 3:
+        sys.exit("Tukey test requires at least 3 files")
+    result: dict = tukey_hsd(list(map(run_label, arguments.files)), load_summaries(arguments), alpha=1 - arguments.confidence)
+    print(tukey_table(result))
+    if arguments.output:
+        save_tukey(result, arguments.output)
+
+
+def intervals(arguments: argparse.Namespace) -> None:
+    from intervals import Interval, compare_intervals, write_clusters
+
+    errors: dict = dict(std=lambda summary: summary.std(), sem=lambda summary: summary.sem(), ci=lambda summary: summary.ci(arguments.confidence))
+    found: list = [Interval(summary.mean, errors[arguments.error](summary), run_label(file_name)) for file_name, summary in zip(arguments.files, load_summaries(arguments))]
+    compare_intervals(found, arguments.error.upper())
+    if arguments.output:
+        write_clusters(found, arguments.output)
+
+
+def plot(arguments: argparse.Namespace) -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from decimate import figure_pixels, min_max_decimate
+
+    fig_width_cm, fig_height_cm, dpi = 32.0, 16.0, 150
+    unit: str = "Throughput (msgs/sec)" if "throughput" in metric_column(arguments) else "Latency (ms)"
+    plt.figure(figsize=(fig_width_cm / 2.54, fig_height_cm / 2.54))
+    if arguments.kind == "line":
+        for file_name in arguments.files:
+            y = cached_values(file_name, metric_column(arguments), arguments.remove_tail, arguments.remove_head)
+            x, y = min_max_decimate(np.arange(1, len(y) + 1), y, figure_pixels(fig_width_cm, dpi))
+            plt.plot(x, y, label=run_label(file_name), linewidth="2")
+        plt.xlabel("Message aggregation (#)")
+        plt.legend()
+        plt.grid(True)
+    else:
+        summaries: list = load_summaries(arguments)
+        plt.bar(range(len(summaries)), [summary.mean for summary in summaries], yerr=[summary.ci(arguments.confidence) for summary in summaries], edgecolor="black", capsize=8)
+        plt.xticks(range(len(summaries)), list(map(run_label, arguments.files)), rotation=30, ha="right")
+    plt.ylabel(unit)
+    plt.title(f"{metric_column(arguments)} data")
+    plt.ylim(ymin=0)
+    plt.savefig(arguments.output, bbox_inches="tight", dpi=dpi)
+    print(f"Saved {arguments.output}")
+
+
+def parse_arguments(argv: list[str] = None) -> argparse.Namespace:
+    files = argparse.ArgumentParser(add_help=False)
+    files.add_argument("files", nargs="+", help="Experiment .csv files")
+    files.add_argument("--metric", choices=["throughput", "latency"], default="throughput", help="Uses total_throughput or average_latency")
+    files.add_argument("--column", help="Any other column of the files instead of the metric column")
+    files.add_argument("--remove-tail", type=int, default=0, help="The number of values to remove from the beginning of every file")
+    files.add_argument("--remove-head", type=int, default=0, help="The number of values to remove from the end of every file")
+    files.add_argument("--confidence", type=float, default=0.95)
+
+    parser = argparse.ArgumentParser(description="Statistics and charts of Kafka/RabbitMQ experiment files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("summary", parents=[files], help="Count, mean, std, sem, ci, min and max of every file").set_defaults(function=summary)
+    commands.add_parser("anova", parents=[files], help="One-way ANOVA of the files").set_defaults(function=anova)
+    tukey_parser = commands.add_parser("tukey", parents=[files], help="Tukey HSD test of the files")
+    tukey_parser.add_argument("--output", help="Save the results as .json")
+    tukey_parser.set_defaults(function=tukey)
+    intervals_parser = commands.add_parser("intervals", parents=[files], help="Overlapping error intervals of the files")
+    intervals_parser.add_argument("--error", choices=["std", "sem", "ci"], default="ci")
+    intervals_parser.add_argument("--output", help="Save the overlap clusters as .csv")
+    intervals_parser.set_defaults(function=intervals)
+    plot_parser = commands.add_parser("plot", parents=[files], help="Line or bar chart of the files")
+    plot_parser.add_argument("--kind", choices=["line", "bar"], default="line")
+    plot_parser.add_argument("--output", required=True, help="Image file to save the chart to")
+    plot_parser.set_defaults(function=plot)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    parsed = parse_arguments()
+    parsed.function(parsed)
@@ -29,22 +29,53 @@ class Interval {
 }
 
 /**
- * Compares every interval in an array with every other interval in the array to see if they overlap or not.
- * Logs which intervals overlap.
+ * Finds every pair of overlapping intervals once by sweeping the intervals in order of their minimum.
+ * Intervals that end before the current interval starts can never overlap a later interval and are dropped,
+ * so every interval still open overlaps the current one. Runs in O(n log n + k) for k overlapping pairs.
+ * @param {Array} intervals The intervals to compare
+ * @returns {Array} Pairs [a, b] of overlapping intervals
+ */
+function overlappingPairs(intervals) {
+  const pairs = [];
+  let openIntervals = [];
+  for(const interval of [...intervals].sort((a, b) => a.min - b.min)) {
+    openIntervals = openIntervals.filter(open => open.max >= interval.min);
+    for(const open of openIntervals) {
+      pairs.push([open, interval]);
+    }
+    openIntervals.push(interval);
+  }
+  return pairs;
+}
+
+/**
+ * Groups intervals into clusters connected by overlaps.
+ * Groups in different clusters are statistically distinguishable at the chosen error type.
+ * @param {Array} intervals The intervals to cluster
+ * @returns {Array} Rows { cluster, name, min, max } that can be printed as a table
+ */
+function overlapClusters(intervals) {
+  const rows = [];
+  let cluster = -1;
+  let clusterMax = -Infinity;
+  for(const interval of [...intervals].sort((a, b) => a.min - b.min)) {
+    if(interval.min > clusterMax) cluster++; // Nothing before this interval reaches it, start a new cluster
+    clusterMax = Math.max(clusterMax, interval.max);
+    rows.push({ cluster, name: interval.name, min: interval.min, max: interval.max });
+  }
+  return rows;
+}
+
+/**
+ * Logs every pair of overlapping intervals once and a table of the overlap clusters.
  * @param {Array} intervals The intervals to compare
  * @param {String} type The type of interval that will be logged
  */
 function compareIntervals(intervals, type = "") {
-  for(let i = 0; i < intervals.length; i++) {
-    const a = intervals[i];
-    for(let j = 0; j < intervals.length; j++) {
-      if(i === j) continue; // Do not compare an interval with itself
-      const b = intervals[j];
-      if(a.overlapsWith(b)) {
-        console.log(`${type}: ${a.name} and ${b.name} overlaps.`);
-      }
-    }
+  for(const [a, b] of overlappingPairs(intervals)) {
+    console.log(`${type}: ${a.name} and ${b.name} overlaps.`);
   }
+  console.table(overlapClusters(intervals));
 }
 
 const throhgputIntervals = [
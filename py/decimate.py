@@ -0,0 +1,30 @@
+import numpy as np
+
+# Reduces a long series to at most a min and a max point per horizontal pixel before it is plotted.
+# Lines drawn from the reduced series look the same as lines drawn from every point (spikes are kept since the
+# extremes of every bucket are kept), but plotting time no longer grows with the length of the experiment.
+
+
+def figure_pixels(fig_width_cm: float, dpi: int) -> int:
+    return int(fig_width_cm / 2.54 * dpi)
+
+
+def min_max_decimate(x: np.ndarray, y: np.ndarray, buckets: int) -> tuple:
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= 2 * buckets:
+        return x, y
+
+    bucket_size = -(-len(y) // buckets)  # Ceiling division
+    padded = np.full(bucket_size * buckets, np.nan)
+    padded[:len(y)] = y
+    rows = padded.reshape(buckets, bucket_size)
+
+    # Missing values never win, a bucket without any values keeps one missing value to leave a gap in the line
+    offsets = np.arange(buckets) * bucket_size
+    min_index = offsets + np.where(np.isnan(rows), np.inf, rows).argmin(axis=1)
+    max_index = offsets + np.where(np.isnan(rows), -np.inf, rows).argmax(axis=1)
+
+    indices = np.sort(np.stack([min_index, max_index], axis=1), axis=1).ravel()  # Keep the order the values came in
+    indices = indices[indices < len(y)]
+    return x[indices], y[indices]
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+from instrument import stage
+from parallel import run_tasks
+
+# Make-style incremental build of figures.
+# Every figure has a key hashed from everything that goes into it (data file hashes, trims, metric, error type, colors, dpi...).
+# The keys of the last build are stored in a manifest in the output folder and figures with an unchanged key are not rendered again.
+
+manifest_name: str = ".figures.json"
+
+
+def figure_key(*inputs) -> str:
+    return hashlib.sha1(json.dumps(inputs, default=str).encode()).hexdigest()
+
+
+def read_manifest(folder: str) -> dict:
+    path = os.path.join(folder, manifest_name)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_manifest(folder: str, manifest: dict) -> None:
+    path = os.path.join(folder, manifest_name)
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def is_up_to_date(output_file: str, key: str) -> bool:
+    folder, file_name = os.path.split(output_file)
+    return os.path.exists(output_file) and read_manifest(folder).get(file_name) == key
+
+
+def record(output_files: list[str], keys: list[str]) -> None:
+    manifests: dict[str, dict] = {}
+    for output_file, key in zip(output_files, keys):
+        folder, file_name = os.path.split(output_file)
+        if folder not in manifests:
+            manifests[folder] = read_manifest(folder)
+        manifests[folder][file_name] = key
+    for folder, manifest in manifests.items():
+        write_manifest(folder, manifest)
+
+
+def render(output_file: str, function, args: tuple):
+    with stage("render", output_file):
+        return function(*args)
+
+
+def build(figures: list[tuple], workers: int = 1, incremental: bool = False) -> None:
+    """Renders (output_file, key, function, args) figures, skipping up to date figures when incremental.
+    The keys are recorded by this process after rendering, even when the figures are rendered by worker processes."""
+    stale: list[tuple] = [figure for figure in figures if not incremental or not is_up_to_date(figure[0], figure[1])]
+    if incremental and len(stale) < len(figures):
+        print(f"Skipping {len(figures) - len(stale)} up to date figure(s)")
+
+    run_tasks([(render, (output_file, function, args)) for output_file, _, function, args in stale], workers)
+    record([figure[0] for figure in stale], [figure[1] for figure in stale])
@@ -0,0 +1,245 @@
+import argparse
+import math
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from decimate import figure_pixels
+from streaming import RunningStats
+
+# Follows an experiment .csv file while the experiment is still writing it (like tail -f).
+# Only the rows appended since the last read are parsed and added to running statistics and to a fixed number of min/max
+# buckets for the chart, so every update costs the same however long the run gets. The confidence interval half-width of every followed column is computed from the means of
+# consecutive batches of rows (values of a second depend on the seconds before it) and once every half-width is below
+# the target the run has enough data: a message is printed, an optional command is run (e.g. the stop script) and the
+# follower exits, so a run can be stopped as soon as it is precise enough instead of after a fixed duration.
+
+followed_columns: list[str] = ["total_throughput", "average_latency"]
+remove_tail: int = 20  # The number of rows to ignore at the beginning of the run (producers produce before consumer is ready)
+batch_size: int = 10  # The number of rows per batch for the batch means confidence intervals, 1 treats every row as independent
+confidence_level: float = 0.95
+target: float = 0.01  # The confidence interval half-width to reach, relative to the mean (0.01 is ±1%)
+interval: float = 5.0  # Seconds between reading the file, printing the statistics and redrawing the chart
+idle_timeout: float = 120.0  # Stop following when the file has not grown for this many seconds (the run is over)
+chart_buckets: int = figure_pixels(32.0, 150)  # The number of min/max buckets kept per column for the chart (one per horizontal pixel)
+
+
+class TailReader:
+    """Reads the complete rows appended to a .csv file since the previous read."""
+
+    def __init__(self, file_name: str):
+        self.file_name: str = file_name
+        self.offset: int = 0
+        self.columns: list[str] = []
+        self.pending: bytes = b""  # Start of a row that is still being written
+
+    def read_rows(self) -> list[list[str]]:
+        if not os.path.exists(self.file_name) or os.path.getsize(self.file_name) < self.offset:
+            return []  # Not created yet, or replaced by a shorter file
+        with open(self.file_name, "rb") as file:
+            file.seek(self.offset)
+            appended = file.read()
+        self.offset += len(appended)
+
+        lines = (self.pending + appended).split(b"\n")
+        self.pending = lines.pop()  # Empty when the last row is complete
+        rows: list[list[str]] = [line.decode().rstrip("\r").split(",") for line in lines if line.strip()]
+        if not self.columns and rows:
+            self.columns = rows.pop(0)
+        return rows
+
+
+def extremes(x: np.ndarray, y: np.ndarray) -> tuple:
+    # The min and max point of every row of x/y in the order they came in, a row without values keeps one missing value
+    rows = np.arange(len(y))[:, np.newaxis]
+    chosen = np.sort(np.stack([np.where(np.isnan(y), np.inf, y).argmin(axis=1), np.where(np.isnan(y), -np.inf, y).argmax(axis=1)], axis=1), axis=1)
+    return x[rows, chosen], y[rows, chosen]
+
+
+class MinMaxBuffer:
+    """The min and max point of buckets of consecutive values, at most buckets buckets however many values are added.
+    When full, every two neighbouring buckets are merged and new buckets hold twice as many values."""
+
+    def __init__(self, buckets: int):
+        self.buckets: int = buckets
+        self.bucket_size: int = 1  # The number of values of new buckets
+        self.count: int = 0  # The number of values added
+        self.x: np.ndarray = np.empty((0, 2), dtype=np.int64)  # Min and max point of every complete bucket
+        self.y: np.ndarray = np.empty((0, 2))
+        self.partial_x: np.ndarray = np.empty(0, dtype=np.int64)  # Min and max point of the bucket that is being filled
+        self.partial_y: np.ndarray = np.empty(0)
+        self.partial_count: int = 0
+
+    def add_values(self, values: list[float]) -> None:
+        y = np.asarray(values, dtype=np.float64)
+        x = np.arange(self.count + 1, self.count + len(y) + 1)  # First value at 1 like the other line charts
+        self.count += len(y)
+
+        # Values that complete the bucket that is being filled
+        fill = min(self.bucket_size - self.partial_count, len(y))
+        if fill:
+            partial_x, partial_y = extremes(np.concatenate([self.partial_x, x[:fill]])[np.newaxis], np.concatenate([self.partial_y, y[:fill]])[np.newaxis])
+            self.partial_x, self.partial_y = partial_x[0], partial_y[0]
+            self.partial_count += fill
+            x, y = x[fill:], y[fill:]
+        if self.partial_count == self.bucket_size:
+            self.x = np.concatenate([self.x, self.partial_x[np.newaxis]])
+            self.y = np.concatenate([self.y, self.partial_y[np.newaxis]])
+            self.partial_x, self.partial_y, self.partial_count = np.empty(0, dtype=np.int64), np.empty(0), 0
+
+        # Complete buckets of the other values at once, the rest starts a new bucket
+        complete = len(y) // self.bucket_size * self.bucket_size
+        if complete:
+            bucket_x, bucket_y = extremes(x[:complete].reshape(-1, self.bucket_size), y[:complete].reshape(-1, self.bucket_size))
+            self.x = np.concatenate([self.x, bucket_x])
+            self.y = np.concatenate([self.y, bucket_y])
+        if complete < len(y):
+            partial_x, partial_y = extremes(x[np.newaxis, complete:], y[np.newaxis, complete:])
+            self.partial_x, self.partial_y = partial_x[0], partial_y[0]
+            self.partial_count = len(y) - complete
+
+        while len(self.x) > self.buckets:
+            self.merge()
+
+    def merge(self) -> None:
+        # Every two neighbouring buckets become one, an odd last bucket is kept as it is
+        pairs = len(self.x) // 2 * 2
+        merged_x, merged_y = extremes(self.x[:pairs].reshape(-1, 4), self.y[:pairs].reshape(-1, 4))
+        self.x = np.concatenate([merged_x, self.x[pairs:]])
+        self.y = np.concatenate([merged_y, self.y[pairs:]])
+        self.bucket_size *= 2
+
+    def points(self) -> tuple:
+        return np.concatenate([self.x.ravel(), self.partial_x]), np.concatenate([self.y.ravel(), self.partial_y])
+
+
+class ColumnFollower:
+    """Running statistics of one column, with batch means for the confidence interval."""
+
+    def __init__(self, column: str):
+        self.column: str = column
+        self.chart: MinMaxBuffer = MinMaxBuffer(chart_buckets)  # Extremes of the followed values for the line chart
+        self.summary: RunningStats = RunningStats()
+        self.batches: RunningStats = RunningStats()  # Summary of the means of complete batches
+        self.batch: list[float] = []
+
+    def add_values(self, values: list[float]) -> None:
+        self.chart.add_values(values)
+        self.summary.add_values(values)
+        self.batch.extend(value for value in values if not math.isnan(value))
+        complete = len(self.batch) // batch_size * batch_size
+        if complete:
+            self.batches.add_values(np.reshape(self.batch[:complete], (-1, batch_size)).mean(axis=1))
+            self.batch = self.batch[complete:]
+
+    def halfwidth(self) -> float:
+        return self.batches.ci(confidence_level) if self.batches.count > 1 else math.inf
+
+    def relative_halfwidth(self) -> float:
+        return self.halfwidth() / abs(self.summary.mean) if self.summary.mean else math.inf
+
+
+def parse_value(cell: str) -> float:
+    return float(cell) if cell else math.nan  # Producers that are not running yet have empty cells
+
+
+class LiveChart:
+    """Line chart of the followed columns that is redrawn in place, or saved to a file when there is no display."""
+
+    def __init__(self, file_name: str, output_file: str = None):
+        import matplotlib
+        if output_file:
+            matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        self.plt = plt
+        self.output_file: str = output_file
+        if not output_file:
+            plt.ion()
+        self.figure, self.axes = plt.subplots(len(followed_columns), 1, sharex=True, figsize=(32.0 / 2.54, 8.0 * len(followed_columns) / 2.54), squeeze=False)
+        self.lines: list = []
+        for axes, column in zip(self.axes[:, 0], followed_columns):
+            self.lines.append(axes.plot([], [], linewidth=2, color="#0D95BC")[0])
+            axes.set_ylabel(column)
+            axes.grid(True)
+        self.axes[-1, 0].set_xlabel("Message aggregation (#)")
+        self.figure.suptitle(os.path.basename(file_name))
+
+    def redraw(self, followers: list[ColumnFollower]) -> None:
+        for axes, line, follower in zip(self.axes[:, 0], self.lines, followers):
+            line.set_data(*follower.chart.points())
+            axes.set_title(f"mean {follower.summary.mean:.2f} ±{follower.halfwidth():.2f} ({int(confidence_level * 100)}% CI, target ±{target * 100:g}%)", fontsize=10)
+            axes.relim()
+            axes.autoscale_view()
+        if self.output_file:
+            self.figure.savefig(self.output_file, bbox_inches="tight", dpi=150)
+        else:
+            self.figure.canvas.draw_idle()
+            self.plt.pause(0.01)
+
+
+def follow(file_name: str, chart: LiveChart = None, on_target: str = None) -> bool:
+    """Follows file_name until every followed column reaches the target (True) or the file stops growing (False)."""
+    reader = TailReader(file_name)
+    followers: list[ColumnFollower] = [ColumnFollower(column) for column in followed_columns]
+    indices: list[int] = None  # Position of every followed column, known once the header has been read
+    rows_seen: int = 0
+    last_growth: float = time.monotonic()
+
+    while True:
+        rows = reader.read_rows()
+        if reader.columns and indices is None:
+            missing: list[str] = [follower.column for follower in followers if follower.column not in reader.columns]
+            if missing:
+                sys.exit(f"{file_name} has no column {', '.join(missing)}, its columns are {', '.join(reader.columns)}")
+            indices = [reader.columns.index(follower.column) for follower in followers]
+        if rows:
+            last_growth = time.monotonic()
+            skipped = max(min(remove_tail - rows_seen, len(rows)), 0)
+            rows_seen += len(rows)
+            rows = rows[skipped:]
+        if rows:
+            for follower, index in zip(followers, indices):
+                follower.add_values([parse_value(row[index]) if index < len(row) else math.nan for row in rows])
+
+            print(f"{rows_seen} rows: " + ", ".join(
+                f"{follower.column} {follower.summary.mean:.2f} ±{follower.halfwidth():.2f} ({follower.relative_halfwidth() * 100:.2f}%)" for follower in followers))
+            if chart is not None:
+                chart.redraw(followers)
+
+            if all(follower.relative_halfwidth() <= target for follower in followers):
+                print(f"Target reached after {rows_seen} rows, every confidence interval is within ±{target * 100:g}% of its mean")
+                if on_target:
+                    subprocess.run(on_target, shell=True)
+                return True
+
+        if time.monotonic() - last_growth > idle_timeout:
+            print(f"{file_name} has not grown for {idle_timeout:g} seconds, target not reached")
+            return False
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow a running experiment and signal when its confidence intervals are narrow enough")
+    parser.add_argument("file", help="The experiment .csv file that is being written")
+    parser.add_argument("--columns", nargs="+", default=followed_columns)
+    parser.add_argument("--target", type=float, default=target, help="Relative confidence interval half-width to reach (0.01 is ±1%% of the mean)")
+    parser.add_argument("--remove-tail", type=int, default=remove_tail)
+    parser.add_argument("--batch-size", type=int, default=batch_size)
+    parser.add_argument("--interval", type=float, default=interval)
+    parser.add_argument("--idle-timeout", type=float, default=idle_timeout)
+    parser.add_argument("--on-target", help="Shell command to run once the target is reached, e.g. \"./sh/kafka-stop-experiment.sh 5 3\"")
+    parser.add_argument("--chart", help="Save the chart to this image file on every update instead of showing it in a window")
+    parser.add_argument("--no-chart", action="store_true")
+    arguments = parser.parse_args()
+
+    followed_columns = arguments.columns
+    target = arguments.target
+    remove_tail = arguments.remove_tail
+    batch_size = arguments.batch_size
+    interval = arguments.interval
+    idle_timeout = arguments.idle_timeout
+
+    live_chart = None if arguments.no_chart else LiveChart(arguments.file, arguments.chart)
+    sys.exit(0 if follow(arguments.file, live_chart, arguments.on_target) else 1)
@@ -0,0 +1,83 @@
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Opt-in timing and memory measurement of the stages of an analysis run (parsing, reading the cache, trimming,
+# statistics, tests and rendering), per stage and per file, without an external profiler.
+# Every stage records its wall and CPU time and the peak memory allocated while it ran (tracemalloc, which also sees
+# numpy arrays). When not enabled, a stage costs a single check.
+
+enabled: bool = False
+records: list[dict] = []  # One entry per finished stage
+_peaks: list[int] = []  # Highest traced memory of every stage that is running, innermost last
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def max_rss() -> int:
+    # Peak resident memory of the process in bytes (kilobytes on Linux, bytes on macOS)
+    if resource is None:
+        return -1
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+@contextlib.contextmanager
+def stage(name: str, file_name: str = ""):
+    if not enabled:
+        yield
+        return
+
+    _peaks.append(0)
+    tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        peak = max(tracemalloc.get_traced_memory()[1], _peaks.pop())
+        if _peaks:
+            _peaks[-1] = max(_peaks[-1], peak)  # Resetting the peak for this stage must not hide it from the enclosing stage
+        # Peak memory allocated on top of what was already allocated when the stage started
+        records.append(dict(stage=name, file=file_name, wall=wall, cpu=cpu, peak_memory=peak - start_memory, max_rss=max_rss(), pid=os.getpid()))
+
+
+def report_table(in_records: list[dict]) -> str:
+    # Records of the same stage and file are added together, in the order the stages first ran
+    totals: dict[tuple, dict] = {}
+    for record in in_records:
+        total = totals.setdefault((record["stage"], record["file"]), dict(calls=0, wall=0.0, cpu=0.0, peak_memory=0))
+        total["calls"] += 1
+        total["wall"] += record["wall"]
+        total["cpu"] += record["cpu"]
+        total["peak_memory"] = max(total["peak_memory"], record["peak_memory"])
+
+    width: int = max([len("file"), *[len(os.path.basename(file_name)) for _, file_name in totals]])
+    lines: list[str] = [f"{'stage':<12} {'file':<{width}} {'calls':>5} {'wall (s)':>9} {'cpu (s)':>9} {'peak (MB)':>9}"]
+    for (name, file_name), total in totals.items():
+        lines.append(f"{name:<12} {os.path.basename(file_name):<{width}} {total['calls']:5d} {total['wall']:9.4f} {total['cpu']:9.4f} {total['peak_memory'] / 2 ** 20:9.2f}")
+    return "\n".join(lines)
+
+
+def report(file_name: str) -> None:
+    """Writes every recorded stage to a .json file and prints them as a table."""
+    with open(file_name, "w") as file:
+        json.dump(records, file, indent=2)
+    print(report_table(records))
+    print(f"Profile written to {file_name}")
@@ -0,0 +1,62 @@
+import csv
+import heapq
+
+# Overlap detection between error intervals (mean ± std/sem/ci) of many groups.
+# Intervals are swept in order of their minimum while a heap keeps the intervals that are still open, which finds
+# every overlapping pair once in O(n log n + k) instead of comparing every ordered pair.
+
+
+class Interval:
+    def __init__(self, mean, error, label):
+        self.min = mean - error
+        self.max = mean + error
+        self.label = label
+
+    def overlaps_with(self, interval):
+        if self.min <= interval.min <= self.max:
+            return True
+        if self.min <= interval.max <= self.max:
+            return True
+        if interval.min <= self.min and self.max <= interval.max:
+            return True
+        return False
+
+
+def overlapping_pairs(intervals: list[Interval]) -> list[tuple]:
+    pairs: list[tuple] = []
+    open_intervals: list[tuple] = []  # Heap of (max, index) of the intervals started so far that may still overlap
+    for index in sorted(range(len(intervals)), key=lambda i: intervals[i].min):
+        interval = intervals[index]
+        while open_intervals and open_intervals[0][0] < interval.min:
+            heapq.heappop(open_intervals)  # Ends before this and every later interval starts
+        for _, other in open_intervals:
+            pairs.append((intervals[other], interval))
+        heapq.heappush(open_intervals, (interval.max, index))
+    return pairs
+
+
+def overlap_clusters(intervals: list[Interval]) -> list[list[Interval]]:
+    # Groups of intervals connected by overlaps, groups in different clusters are distinguishable from each other
+    clusters: list[list[Interval]] = []
+    cluster_max: float = float("-inf")
+    for interval in sorted(intervals, key=lambda interval: interval.min):
+        if not clusters or interval.min > cluster_max:
+            clusters.append([])
+            cluster_max = interval.max
+        clusters[-1].append(interval)
+        cluster_max = max(cluster_max, interval.max)
+    return clusters
+
+
+def compare_intervals(intervals: list[Interval], interval_type: str):
+    for a, b in overlapping_pairs(intervals):
+        print(f"{interval_type}: {a.label} and {b.label} overlaps.")
+
+
+def write_clusters(intervals: list[Interval], file_name: str) -> None:
+    with open(file_name, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["cluster", "label", "min", "max"])
+        for cluster_id, cluster in enumerate(overlap_clusters(intervals)):
+            for interval in cluster:
+                writer.writerow([cluster_id, interval.label, round(interval.min, 6), round(interval.max, 6)])
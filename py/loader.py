@@ -0,0 +1,133 @@
+import os
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+from instrument import stage
+from npz_cache import cache_matches, cache_path, file_hash, time_column
+
+# Parsing the wide experiment .csv files (ISO time strings, one column per producer) dominates every analysis run.
+# Each file is therefore converted once into a compact columnar .npz cache (narrowed types, parsed timestamps) in a .cache folder next to the .csv file.
+# The cache is reused until the source file changes (size/mtime differ and the content hash no longer matches).
+
+_runs: dict = {}  # Runs already opened by this process, keyed on absolute path
+
+
+def compact(values: np.ndarray) -> np.ndarray:
+    # Store a column in the smallest type that gives back exactly the same values (throughput counts fit in int32/float32)
+    if values.dtype.kind == "i" and (len(values) == 0 or np.iinfo(np.int32).min <= values.min() <= values.max() <= np.iinfo(np.int32).max):
+        return values.astype(np.int32)
+    if values.dtype.kind == "f" and np.array_equal(values.astype(np.float32), values, equal_nan=True):
+        return values.astype(np.float32)
+    return values
+
+
+def write_cache(file_name: str, data: DataFrame, source_hash: str) -> None:
+    stat = os.stat(file_name)
+    arrays: dict[str, np.ndarray] = {}
+    for column in data.columns:
+        if column == time_column:
+            arrays[column] = pd.to_datetime(data[column], utc=True).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        else:
+            arrays[column] = compact(data[column].to_numpy())
+
+    path = cache_path(file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        np.savez(
+            file,
+            __columns__=np.array(data.columns, dtype=str),
+            __dtypes__=np.array([str(data[column].dtype) for column in data.columns], dtype=str),
+            __size__=np.int64(stat.st_size),
+            __mtime_ns__=np.int64(stat.st_mtime_ns),
+            __hash__=np.array(source_hash),
+            **arrays,
+        )
+    os.replace(temp_path, path)  # Never leave a half written cache behind if the process is killed
+
+
+def cache_is_fresh(file_name: str) -> bool:
+    path = cache_path(file_name)
+    if not os.path.exists(path):
+        return False
+    if cache_matches(file_name):
+        return True
+
+    stat = os.stat(file_name)
+    with np.load(path) as cache:
+        source_hash = str(cache["__hash__"])
+        if int(cache["__size__"]) != stat.st_size or source_hash != file_hash(file_name):
+            return False
+
+    # Same content but touched (e.g. copied or checked out again), store the new mtime to skip hashing next time
+    write_cache(file_name, read_cache(file_name), source_hash)
+    return True
+
+
+def ensure_cache(file_name: str) -> None:
+    # The first time a file is seen, the whole file has to be parsed once to build the cache
+    if not cache_is_fresh(file_name):
+        with stage("parse", file_name):
+            write_cache(file_name, pd.read_csv(file_name), file_hash(file_name))
+
+
+def read_cache(file_name: str, columns: list = None) -> DataFrame:
+    # Only the requested columns are read from the .npz archive, every column is stored as its own member
+    with np.load(cache_path(file_name)) as cache:
+        dtypes: dict = dict(zip([str(column) for column in cache["__columns__"]], [str(dtype) for dtype in cache["__dtypes__"]]))
+        data: dict = {}
+        for column in columns if columns is not None else dtypes:
+            if column == time_column:
+                data[column] = pd.to_datetime(cache[column], utc=True)
+            else:
+                data[column] = cache[column].astype(dtypes[column])  # Same types as pd.read_csv would give
+    return pd.DataFrame(data, columns=list(data))
+
+
+class ExperimentRun:
+    """A lazily loaded experiment file where only the columns that are asked for are read."""
+
+    def __init__(self, file_name: str):
+        self.file_name: str = file_name
+        with open(file_name) as file:
+            self.columns: list[str] = file.readline().strip().split(",")
+        self.producer_num: int = int((len(self.columns) - 3) / 2)
+        self._data: dict[str, Series] = {}
+        self._cache_checked: bool = False
+
+    def load(self, columns: list[str]) -> DataFrame:
+        missing: list = [column for column in columns if column not in self._data]
+        if missing:
+            if not self._cache_checked:
+                ensure_cache(self.file_name)
+            self._cache_checked = True
+            with stage("read cache", self.file_name):
+                for column, series in read_cache(self.file_name, missing).items():
+                    self._data[column] = series
+        return pd.DataFrame({column: self._data[column] for column in columns})
+
+    def series(self, column: str) -> Series:
+        self.load([column])
+        return self._data[column]
+
+
+def load_run(file_name: str) -> ExperimentRun:
+    """Gives the ExperimentRun of a file, at most one per file and process so no column is read twice."""
+    key = os.path.abspath(file_name)
+    if key not in _runs:
+        _runs[key] = ExperimentRun(file_name)
+    return _runs[key]
+
+
+def load_experiment(file_name: str) -> DataFrame:
+    """Loads every column of an experiment .csv file through the binary cache."""
+    run = load_run(file_name)
+    return run.load(run.columns)
+
+
+def source_hash(file_name: str) -> str:
+    # Content hash of an experiment file, taken from its cache when the cache is fresh so the file does not have to be read
+    if cache_is_fresh(file_name):
+        with np.load(cache_path(file_name)) as cache:
+            return str(cache["__hash__"])
+    return file_hash(file_name)
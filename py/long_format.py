@@ -0,0 +1,129 @@
+import os
+import numpy as np
+from loader import cache_path, ensure_cache, load_run, source_hash
+from npz_cache import read_columns
+from streaming import RunningStats
+
+# Per producer measurements in long format: one entry per producer per second that has a value.
+# The wide files have a throughput and a latency column per producer that are empty until the producer starts, with
+# hundreds of producers most cells are missing. Only the measured cells are kept (sparse, coordinate format) as a row
+# index (int32), a categorical producer code (int16) and the value (float32, float64 when the cache needs it to keep
+# the exact values), sorted on producer.
+# Statistics of every producer are computed in one grouped pass over these arrays instead of one Series per producer.
+
+
+class LongRun:
+    def __init__(self, producers: list[str], rows: np.ndarray, codes: np.ndarray, values: np.ndarray, row_count: int):
+        self.producers: list[str] = producers  # Categories of codes, e.g. "producer-service-1"
+        self.rows: np.ndarray = rows
+        self.codes: np.ndarray = codes
+        self.values: np.ndarray = values
+        self.row_count: int = row_count  # The number of rows (seconds) of the wide file
+
+    def trim(self, remove_tail: int, remove_head: int) -> "LongRun":
+        # Remove remove_tail rows from the beginning and remove_head rows from the end, rows indexed from 0 again
+        keep = (self.rows >= remove_tail) & (self.rows < self.row_count - remove_head)
+        return LongRun(self.producers, self.rows[keep] - remove_tail, self.codes[keep], self.values[keep], max(self.row_count - remove_tail - remove_head, 0))
+
+    def trim_producers(self, remove_tails: list[int], remove_heads: list[int]) -> "LongRun":
+        # Remove a different number of rows from the beginning and end of every producer (in the order of producers),
+        # e.g. detected warm-up and cool-down, rows keep their index
+        tails = np.asarray(remove_tails, dtype=np.int64)[self.codes]
+        heads = np.asarray(remove_heads, dtype=np.int64)[self.codes]
+        keep = (self.rows >= tails) & (self.rows < self.row_count - heads)
+        return LongRun(self.producers, self.rows[keep], self.codes[keep], self.values[keep], self.row_count)
+
+    def summaries(self) -> list[RunningStats]:
+        """Count, mean, variance, min and max of every producer from one grouped pass, in the order of producers."""
+        groups = len(self.producers)
+        values = self.values.astype(np.float64)
+        counts = np.bincount(self.codes, minlength=groups)
+        means = np.bincount(self.codes, weights=values, minlength=groups) / np.maximum(counts, 1)
+        m2s = np.bincount(self.codes, weights=(values - means[self.codes]) ** 2, minlength=groups)
+
+        # Values are sorted on producer, so the min and max of every producer are reductions over contiguous segments
+        starts = np.searchsorted(self.codes, np.arange(groups))
+        present = counts > 0
+        mins = np.full(groups, np.inf)
+        maxs = np.full(groups, -np.inf)
+        if present.any():
+            mins[present] = np.minimum.reduceat(values, starts[present])
+            maxs[present] = np.maximum.reduceat(values, starts[present])
+
+        summaries: list[RunningStats] = []
+        for index in range(groups):
+            summary = RunningStats()
+            summary.count, summary.mean, summary.m2 = int(counts[index]), float(means[index]) if counts[index] else 0.0, float(m2s[index])
+            summary.min, summary.max = float(mins[index]), float(maxs[index])
+            summaries.append(summary)
+        return summaries
+
+    def totals(self) -> np.ndarray:
+        # Sum of every row over all producers (total_throughput for throughput values)
+        return np.bincount(self.rows, weights=self.values.astype(np.float64), minlength=self.row_count)
+
+
+def long_cache_path(file_name: str, metric: str) -> str:
+    return cache_path(file_name).replace(".npz", f".{metric}.long.npz")
+
+
+def build_long(file_name: str, metric: str) -> LongRun:
+    # Columns are read from the cache one at a time and only their measured cells are kept, nothing is kept in the run
+    ensure_cache(file_name)
+    columns: list[str] = [column for column in load_run(file_name).columns if column.startswith("producer-service") and column.endswith(f"_{metric}")]
+    rows: list[np.ndarray] = []
+    codes: list[np.ndarray] = []
+    values: list[np.ndarray] = []
+    row_count: int = 0
+    for code, column in enumerate(columns):
+        column_values = read_columns(file_name, [column])[column]
+        column_values = column_values.astype(np.float64 if column_values.dtype == np.float64 else np.float32)
+        row_count = len(column_values)
+        measured = np.flatnonzero(~np.isnan(column_values))
+        rows.append(measured.astype(np.int32))
+        codes.append(np.full(len(measured), code, dtype=np.int16))
+        values.append(column_values[measured])
+    producers: list[str] = [column[:-len(metric) - 1] for column in columns]
+    if not columns:
+        return LongRun(producers, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int16), np.empty(0, dtype=np.float32), 0)
+    return LongRun(producers, np.concatenate(rows), np.concatenate(codes), np.concatenate(values), row_count)
+
+
+def load_long(file_name: str, metric: str) -> LongRun:
+    """The per producer throughput or latency values of an experiment file in long format, cached next to the wide cache."""
+    path = long_cache_path(file_name, metric)
+    content_hash = source_hash(file_name)
+    if os.path.exists(path):
+        with np.load(path) as cache:
+            if str(cache["__hash__"]) == content_hash:
+                return LongRun([str(producer) for producer in cache["producers"]], cache["rows"], cache["codes"], cache["values"], int(cache["row_count"]))
+
+    long_run = build_long(file_name, metric)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        np.savez(file, __hash__=np.array(content_hash), producers=np.array(long_run.producers, dtype=str), rows=long_run.rows,
+                 codes=long_run.codes, values=long_run.values, row_count=np.int64(long_run.row_count))
+    os.replace(temp_path, path)
+    return long_run
+
+
+def fairness(throughput: LongRun) -> dict:
+    """Share of the total throughput of every producer and Jain's fairness index (1 when every producer gets the same share)
+    over the whole run and averaged over the seconds where more than one producer was measured."""
+    values = throughput.values.astype(np.float64)
+    producer_totals = np.bincount(throughput.codes, weights=values, minlength=len(throughput.producers))
+    shares = producer_totals / producer_totals.sum() if producer_totals.sum() > 0 else np.full(len(producer_totals), np.nan)
+
+    row_sums = np.bincount(throughput.rows, weights=values, minlength=throughput.row_count)
+    row_squares = np.bincount(throughput.rows, weights=values ** 2, minlength=throughput.row_count)
+    row_counts = np.bincount(throughput.rows, minlength=throughput.row_count)
+    shared = (row_counts > 1) & (row_squares > 0)
+    per_second = row_sums[shared] ** 2 / (row_counts[shared] * row_squares[shared])
+
+    return dict(
+        producers=throughput.producers,
+        shares=shares,
+        jain=float(producer_totals.sum() ** 2 / (len(producer_totals) * (producer_totals ** 2).sum())) if (producer_totals ** 2).sum() > 0 else np.nan,
+        jain_per_second=float(per_second.mean()) if len(per_second) else np.nan,
+    )
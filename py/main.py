@@ -1,11 +1,18 @@
+import argparse
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
-import scipy.stats as stats
-import statsmodels.stats.multicomp as multi
 from matplotlib.container import BarContainer
-from pandas import DataFrame, Series
+from pandas import Series
 import enum
+from decimate import figure_pixels, min_max_decimate
+from figures import build, figure_key
+import instrument
+from loader import ExperimentRun, load_run, source_hash
+from long_format import fairness, load_long
+from sketch import LatencySketch, run_sketch
+from steady_state import batch_means_ci, steady_state_cut
+from streaming import RunningStats, one_way_anova, summarise_column, trim_series
+from tukey import plot_simultaneous, tukey_hsd, tukey_table
 
 
 class Metric(str, enum.Enum):
@@ -23,69 +30,113 @@ class ErrorType(str, enum.Enum):
 kafka_file_name: str = "./data/pilot_study/Kafka-5-5-Pilotstudie.csv"
 rabbitmq_file_name: str = "./data/pilot_study/RabbitMQ-5-5-Pilotstudie.csv"
 img_output_folder: str = "./data/pilot_study/img/"
-metric: Metric = Metric.Latency  # The metric to graph from the files
-error_type: ErrorType = ErrorType.STD  # The error type to show in bar graph
+metric: Metric = Metric.Latency  # The metric to graph from the files (when not passed with --metrics)
+error_type: ErrorType = ErrorType.STD  # The error type to show in bar graph (when not passed with --errors)
 only_total_average = True  # Show only data in total throughput column / average latency column if true otherwise show all throughput/latency columns (every producer) except total/average
 remove_tail: int = 10  # The number of values to remove from the beginning of data (producers produce before consumer is ready causing low throughput and high latency in beginning of experiment)
 remove_head: int = 10  # The number of values to remove from head of data
+auto_trim: bool = False  # Detect the warm-up and cool-down of every series (MSER-5) instead of removing remove_tail/remove_head values
+ci_batches: int = 30  # The number of batches used for the batch means confidence intervals of the steady state when auto_trim is true
+streaming: bool = False  # Read the files in chunks keeping only running statistics (constant memory for very long experiments, no line chart)
+chunk_size: int = 100_000  # The number of rows to read at a time when streaming
 confidence_level: float = 0.95
 fig_width_cm: float = 32.0
 fig_height_cm: float = 16.0
 dpi: int = 150
+decimate_lines: bool = True  # Plot only the min and max value per horizontal pixel of long series in line charts (keeps spikes visible)
+profile: bool = False  # Measure the time and peak memory of every stage and file, written to profile.json in the output folder (also with --profile)
+headless: bool = False  # Only save figures without showing them and skip figures whose inputs did not change since they were last rendered
+quantiles: list[float] = [0.5, 0.95, 0.99]  # The latency quantiles to report from the latency sketches
+sketch_accuracy: float = 0.01  # Relative accuracy of the latency quantiles
+outputs: list[str] = ["line", "bar", "anova", "tukey", "quantiles", "fairness"]  # Everything that can be emitted for every metric (quantiles and fairness are emitted once)
+default_outputs: list[str] = ["line", "bar", "anova", "tukey", "fairness"]  # Emitted when --emit is not passed (quantiles reads every producer latency and throughput, so it is opt-in)
+
+# Every metric, error type and output selected on the command line is emitted from a single load of the files
+parser = argparse.ArgumentParser(description="Compare the throughput/latency of a Kafka and a RabbitMQ experiment")
+parser.add_argument("--metrics", nargs="+", choices=[value.value for value in Metric], default=[metric.value])
+parser.add_argument("--errors", nargs="+", choices=[value.value for value in ErrorType], default=[error_type.value])
+parser.add_argument("--emit", nargs="+", choices=outputs, default=default_outputs)
+parser.add_argument("--profile", action="store_true", default=profile)
+arguments = parser.parse_args()
+metrics: list[Metric] = [Metric(value) for value in arguments.metrics]
+error_types: list[ErrorType] = [ErrorType(value) for value in arguments.errors]
+emit: list[str] = arguments.emit
+
+if arguments.profile:
+    instrument.enable()
+
+if headless:
+    plt.switch_backend("Agg")
 
-total_average: str = "total" if metric == Metric.Throughput else "average"
 colors: tuple = ("#0D95BC", "#A2B969", "#e9c46a", "#f4a261", "#e76f51", "#f4acb7")
 
-kafka_data: DataFrame = pd.read_csv(kafka_file_name)
-rabbitmq_data: DataFrame = pd.read_csv(rabbitmq_file_name)
+kafka_run: ExperimentRun = load_run(kafka_file_name)
+rabbitmq_run: ExperimentRun = load_run(rabbitmq_file_name)
 
-columns: list = list(kafka_data.columns)
-producer_num: int = int((len(columns) - 3) / 2)
+columns: list = kafka_run.columns  # Only the header has been read at this point
+producer_num: int = kafka_run.producer_num
+file_hashes: list[str] = [source_hash(kafka_file_name), source_hash(rabbitmq_file_name)]
 
-# Filter columns to include only wanted columns based on settings variables
-filtered_columns: list = []
-for column in columns:
-    if metric.value not in column:
-        continue
-    if not only_total_average:
-        if total_average in column:
+
+def filter_columns(in_metric: Metric) -> list:
+    # Filter columns to include only wanted columns based on settings variables
+    total_average: str = "total" if in_metric == Metric.Throughput else "average"
+    filtered_columns: list = []
+    for column in columns:
+        if in_metric.value not in column:
             continue
-        filtered_columns.append(column)
-    else:
-        if total_average in column:
+        if not only_total_average:
+            if total_average in column:
+                continue
             filtered_columns.append(column)
+        else:
+            if total_average in column:
+                filtered_columns.append(column)
+    return filtered_columns
+
+
+# Every filtered column of both files is loaded and summarised once for all selected metrics
+# (the per producer columns are never read when only_total_average is true)
+loaded: dict[tuple, tuple] = {}
+cuts: dict[tuple, tuple] = {}  # (remove_tail, remove_head) of every series
+for selected_metric in metrics:
+    for file_name in (kafka_file_name, rabbitmq_file_name):
+        for column in filter_columns(selected_metric):
+            cuts[(file_name, column)] = steady_state_cut(file_name, column) if auto_trim else (remove_tail, remove_head)
+        if only_total_average:
+            for column in filter_columns(selected_metric):
+                loaded[(file_name, column)] = summarise_column(file_name, column, *cuts[(file_name, column)], streaming, chunk_size)
+            continue
 
-data_series: list[Series] = []  # List of pandas Series (Columns in DataFrame)
-data_list: list[list] = []  # All pandas Series converted to list to easily remove some head and tail values
-labels: list = []
-producers_str: str = str(producer_num) if only_total_average else ""  # Only show number of producers in legend when its the total or average of a number of producers
-for column in filtered_columns:
-    keyword: str = column.replace("_" + metric.value, "")
-    labels.append(f"Kafka {keyword} {producers_str}")
-    data_series.append(kafka_data[column])
-
-    labels.append(f"RabbitMQ {keyword} {producers_str}")
-    data_series.append(rabbitmq_data[column])
-
-for i, _ in enumerate(data_series):
-    if remove_head == 0 and remove_tail == 0:
-        data_list.append(data_series[i].tolist())
-    elif remove_head == 0 and remove_tail != 0:
-        data_list.append(data_series[i].tolist()[remove_tail:])
-    elif remove_head != 0 and remove_tail == 0:
-        data_list.append(data_series[i].tolist()[:-remove_head])
-    else:
-        data_list.append(data_series[i].tolist()[remove_tail:-remove_head])  # Remove a elements from tail of list : remove b elements from head of list)
+        # Every producer is summarised in one grouped pass over the values in long format, the wide producer columns
+        # are only read for the line chart and the steady state detection
+        long_run = load_long(file_name, selected_metric.value)
+        producer_columns: list[str] = [f"{producer}_{selected_metric.value}" for producer in long_run.producers]  # In the order of the producer codes
+        trimmed = long_run.trim_producers([cuts[(file_name, column)][0] for column in producer_columns], [cuts[(file_name, column)][1] for column in producer_columns])
+        producer_summaries: dict[str, RunningStats] = dict(zip(producer_columns, trimmed.summaries()))
+        for column in filter_columns(selected_metric):
+            series = None if streaming or ("line" not in emit and not auto_trim) else trim_series(load_run(file_name).series(column), *cuts[(file_name, column)])
+            loaded[(file_name, column)] = (series, producer_summaries[column])
+
+
+def run_cut(file_name: str, column: str) -> tuple:
+    # (remove_tail, remove_head) for outputs that combine every producer of a run, detected on the total or average
+    # column when auto_trim is true (also when that metric is not graphed)
+    if (file_name, column) not in cuts:
+        cuts[(file_name, column)] = steady_state_cut(file_name, column) if auto_trim else (remove_tail, remove_head)
+    return cuts[(file_name, column)]
+
+
+def line_chart_file() -> str:
+    return f"{img_output_folder}line-{metric.value}-{producer_num}producers.png"
+
+
+def bar_chart_file(error_type: ErrorType) -> str:
+    return f"{img_output_folder}bar-{metric.value}-{error_type.value}-{producer_num}producers.png"
 
-# Convert the cleaned lists to pandas Series and put them in the original list of series after clear
-data_series.clear()
-for column in data_list:
-    data_series.append(pd.Series(column))
 
-min_value = min([*map(lambda col: col.min(), data_series)])
-max_value = max([*map(lambda col: col.max(), data_series)])
-min_length = min([*map(lambda col: len(col), data_series)])
-max_length = max([*map(lambda col: len(col), data_series)])
+def quantile_chart_file() -> str:
+    return f"{img_output_folder}quantiles-latency-{producer_num}producers.png"
 
 
 def cm_to_inch(value):
@@ -96,7 +147,9 @@ def generate_line_chart(in_data_series: list[Series]) -> None:
     plt.figure(figsize=(cm_to_inch(fig_width_cm), cm_to_inch(fig_height_cm)))
     for index, _ in enumerate(in_data_series):
         y = in_data_series[index]
-        x = range(1, len(y) + 1)  # First data point at 1 instead of 0
+        x = np.arange(1, len(y) + 1)  # First data point at 1 instead of 0
+        if decimate_lines:
+            x, y = min_max_decimate(x, y, figure_pixels(fig_width_cm, dpi))
         plt.plot(x, y, label=labels[index], linewidth="2", color=colors[index])
 
     plt.xlabel("Message aggregation (#)")
@@ -105,20 +158,12 @@ def generate_line_chart(in_data_series: list[Series]) -> None:
     plt.legend()
     plt.grid(True)
     plt.ylim(ymin=0)
-    plt.xlim(xmin=0, xmax=max_length - (remove_head + remove_tail))
-    plt.savefig(f"{img_output_folder}line-{metric}-{producer_num}producers.png", bbox_inches="tight", dpi=dpi)
+    plt.xlim(xmin=0, xmax=max_length if auto_trim else max_length - (remove_head + remove_tail))
+    plt.savefig(line_chart_file(), bbox_inches="tight", dpi=dpi)
     plt.show()
 
 
-def mean_confidence_interval(data, confidence=0.95) -> tuple:
-    a = 1.0 * np.array(data)
-    n = len(a)
-    m, se = np.mean(a), stats.sem(a)
-    h = se * stats.t.ppf((1 + confidence) / 2., n - 1)
-    return -h, +h
-
-
-def generate_bar_chart(in_data_series) -> None:
+def generate_bar_chart(in_summaries: list[RunningStats], error_type: ErrorType = ErrorType.STD) -> None:
     bar_width: float = 0.3
 
     means: list[float] = []
@@ -126,11 +171,11 @@ def generate_bar_chart(in_data_series) -> None:
     sems: list[float] = []
     cis: list[float] = []
 
-    for series in in_data_series:
-        means.append(series.mean())
-        stds.append(series.std())
-        sems.append(series.sem())
-        cis.append(mean_confidence_interval(series)[1])
+    for summary in in_summaries:
+        means.append(summary.mean)
+        stds.append(summary.std())
+        sems.append(summary.sem())
+        cis.append(summary.ci(confidence_level))
 
     yerr: list[float] = stds if error_type.value == "std" else (sems if error_type.value == "sem" else cis)
 
@@ -152,16 +197,16 @@ def generate_bar_chart(in_data_series) -> None:
     plt.xlabel("Broker/number of producers")
     plt.title(f"{metric.value.capitalize()} data {producer_num} producer(s) | Means/{error_type.value.upper()}s Comparison")
     plt.ylim(ymin=0)
-    plt.savefig(f"{img_output_folder}bar-{metric}-{producer_num}producers.png", bbox_inches="tight", dpi=dpi)
+    plt.savefig(bar_chart_file(error_type), bbox_inches="tight", dpi=dpi)
     plt.show()
 
 
-def anova(in_data_series: list[Series]) -> None:
-    if len(in_data_series) < 2:
+def anova(in_summaries: list[RunningStats]) -> None:
+    if len(in_summaries) < 2:
         print("Anova test requires at least two groups")
         return
 
-    statistic, pvalue = stats.f_oneway(*in_data_series)
+    statistic, pvalue = one_way_anova(in_summaries)
 
     print(f"ANOVA Statistic {str(statistic)} and p-value {str(pvalue)}")
     if pvalue < (1 - confidence_level):
@@ -170,31 +215,110 @@ def anova(in_data_series: list[Series]) -> None:
         print("No difference in means")
 
 
-def tukey_test(in_data_series: list[Series]) -> None:
-    df: DataFrame = pd.DataFrame()
-
-    if len(in_data_series) < 3:
+def tukey_test(in_summaries: list[RunningStats]) -> None:
+    if len(in_summaries) < 3:
         print("Tukey test requires at least 3 groups")
         return
 
-    for index in range(len(in_data_series)):
-        df[labels[index]] = in_data_series[index]
+    tukey_results: dict = tukey_hsd(labels, in_summaries, alpha=(1.0-confidence_level))
+    print(tukey_table(tukey_results))
 
-    stacked_data = df.stack().reset_index()
-    stacked_data = stacked_data.rename(columns={'level_0': 'id', 'level_1': 'treatment', 0: 'result'})
+    plot_simultaneous(tukey_results)
+    plt.vlines(x=tukey_results["grand_mean"], ymin=-0.5, ymax=len(tukey_results["labels"]) - 0.5, color="red")
+
+    plt.show()
 
-    res2 = multi.pairwise_tukeyhsd(stacked_data['result'], stacked_data['treatment'])
-    print(res2)
 
-    res2.plot_simultaneous()
+def quantile_label(quantile: float) -> str:
+    return f"p{quantile * 100:g}"
 
-    grand_mean = stacked_data['result'].values.mean()
-    plt.vlines(x=grand_mean, ymin=-0.5, ymax=4.5, color="red")
 
+def generate_quantile_chart(in_sketches: list[LatencySketch], in_labels: list[str]) -> None:
+    bar_width: float = 0.3 / len(quantiles)
+
+    plt.figure(figsize=(cm_to_inch(fig_width_cm), cm_to_inch(fig_height_cm)))
+    for index, sketch in enumerate(in_sketches):
+        values = sketch.quantiles(quantiles)
+        offsets = [index + (quantile_index - (len(quantiles) - 1) / 2) * bar_width for quantile_index in range(len(quantiles))]
+        bar_plot: BarContainer = plt.bar(offsets, values, edgecolor="black", width=bar_width, color=colors[index])
+        for quantile, rect in zip(quantiles, bar_plot):
+            plt.text(rect.get_x() + rect.get_width() / 2.0, rect.get_height(), quantile_label(quantile), ha="center", va="bottom", fontsize=10)
+
+    plt.xticks(range(len(in_labels)), in_labels, fontsize=10)
+    plt.ylabel("Latency (ms)")
+    plt.xlabel("Broker/number of producers")
+    plt.title(f"Latency quantiles of every message {producer_num} producer(s)")
+    plt.ylim(ymin=0)
+    plt.savefig(quantile_chart_file(), bbox_inches="tight", dpi=dpi)
     plt.show()
 
 
-generate_line_chart(data_series)
-generate_bar_chart(data_series)
-anova(data_series)
-tukey_test(data_series)
+for metric in metrics:
+    filtered_columns: list = filter_columns(metric)
+
+    labels: list = []
+    producers_str: str = str(producer_num) if only_total_average else ""  # Only show number of producers in legend when its the total or average of a number of producers
+    for column in filtered_columns:
+        keyword: str = column.replace("_" + metric.value, "")
+        labels.append(f"Kafka {keyword} {producers_str}")
+        labels.append(f"RabbitMQ {keyword} {producers_str}")
+
+    data_series: list[Series] = []  # List of pandas Series (Columns in DataFrame), empty when streaming or when the producer columns are not needed for the line chart
+    summaries: list[RunningStats] = []  # Count, mean, variance, min and max of every trimmed series in the same order as labels
+    for column in filtered_columns:
+        for file_name in (kafka_file_name, rabbitmq_file_name):
+            series, summary = loaded[(file_name, column)]
+            if series is not None:
+                data_series.append(series)
+            summaries.append(summary)
+            if auto_trim:
+                cut: tuple = cuts[(file_name, column)]
+                halfwidth: float = float("nan") if series is None else batch_means_ci(series, ci_batches, confidence_level)[1]
+                print(f"{labels[len(summaries) - 1]}: removed {cut[0]} values from the beginning and {cut[1]} from the end, mean {summary.mean} ±{halfwidth} (batch means {int(confidence_level * 100)}% CI)")
+
+    if data_series:
+        min_length = min([*map(lambda col: len(col), data_series)])
+        max_length = max([*map(lambda col: len(col), data_series)])
+    min_value = min([*map(lambda summary: summary.min, summaries)])
+    max_value = max([*map(lambda summary: summary.max, summaries)])
+
+    # Everything the figures depend on, a figure is only rendered again in headless mode if any of these change
+    figure_inputs: list = [
+        file_hashes, metric.value, filtered_columns, remove_tail, remove_head,
+        labels, colors, fig_width_cm, fig_height_cm, dpi, decimate_lines, auto_trim
+    ]
+
+    charts: list[tuple] = []
+    if "line" in emit and data_series:
+        charts.append((line_chart_file(), figure_key("line", *figure_inputs), generate_line_chart, (data_series,)))
+    if "bar" in emit:
+        for error_type in error_types:
+            charts.append((bar_chart_file(error_type), figure_key("bar", error_type.value, confidence_level, *figure_inputs), generate_bar_chart, (summaries, error_type)))
+    build(charts, incremental=headless)
+
+    if "anova" in emit:
+        anova(summaries)
+    if "tukey" in emit:
+        tukey_test(summaries)
+
+if "quantiles" in emit:
+    # Latency of every message (per producer latency weighted by its throughput) instead of the per second averages
+    sketches: list[LatencySketch] = [run_sketch(file_name, *run_cut(file_name, "average_latency"), sketch_accuracy) for file_name in (kafka_file_name, rabbitmq_file_name)]
+    quantile_inputs: list = [file_hashes, remove_tail, remove_head, auto_trim, colors, fig_width_cm, fig_height_cm, dpi, quantiles, sketch_accuracy]
+    quantile_labels: list[str] = [f"Kafka {producer_num}", f"RabbitMQ {producer_num}"]
+    for label, sketch in zip(quantile_labels, sketches):
+        print(f"{label} latency " + ", ".join(f"{quantile_label(quantile)} {value:.4f}" for quantile, value in zip(quantiles, sketch.quantiles(quantiles))))
+    build([(quantile_chart_file(), figure_key("quantiles", *quantile_inputs), generate_quantile_chart, (sketches, quantile_labels))], incremental=headless)
+
+if "fairness" in emit:
+    # Every producer's statistics and share of the total throughput, from one grouped pass over the per producer values in long format
+    for broker, file_name in (("Kafka", kafka_file_name), ("RabbitMQ", rabbitmq_file_name)):
+        throughput = load_long(file_name, Metric.Throughput.value).trim(*run_cut(file_name, "total_throughput"))
+        latency = load_long(file_name, Metric.Latency.value).trim(*run_cut(file_name, "average_latency"))
+        result: dict = fairness(throughput)
+        print(f"{broker} Jain's fairness index {result['jain']} (per second {result['jain_per_second']})")
+        for producer, share, throughput_summary, latency_summary in zip(result["producers"], result["shares"], throughput.summaries(), latency.summaries()):
+            print(f"{broker} {producer} share {share:.4f} throughput {throughput_summary.mean:.2f} ±{throughput_summary.std():.2f} latency {latency_summary.mean:.2f} ±{latency_summary.std():.2f}")
+
+if arguments.profile:
+    instrument.report(f"{img_output_folder}profile.json")
@@ -1,11 +1,21 @@
+import argparse
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
-import scipy.stats as stats
-import statsmodels.stats.multicomp as multi
 from matplotlib.container import BarContainer
 from pandas import Series
 import enum
+from intervals import Interval, compare_intervals, write_clusters
+from loader import load_run, source_hash
+from long_format import fairness, load_long
+from decimate import figure_pixels, min_max_decimate
+from figures import build, figure_key
+import instrument
+from parallel import run_tasks
+from scalability import confidence_band, fit_scalability, predict, save_scalability, scalability_table
+from sketch import LatencySketch, load_sketches, merge_sketches, run_sketch, save_sketches
+from steady_state import batch_means_ci, save_steady_states, steady_state_cut
+from streaming import RunningStats, one_way_anova, summarise_column
+from tukey import plot_simultaneous, save_tukey, tukey_hsd, tukey_table
 
 
 class Metric(str, enum.Enum):
@@ -19,114 +29,156 @@ class ErrorType(str, enum.Enum):
     CI = "ci"
 
 
-class Interval:
-    def __init__(self, mean, error, label):
-        self.min = mean - error
-        self.max = mean + error
-        self.label = label
-
-    def overlaps_with(self, interval):
-        if self.min <= interval.min <= self.max:
-            return True
-        if self.min <= interval.max <= self.max:
-            return True
-        if interval.min <= self.min and self.max <= interval.max:
-            return True
-        return False
-
-
-def compare_intervals(intervals: list[Interval], interval_type: str):
-    for i in range(len(intervals)):
-        a = intervals[i]
-        for j in range(len(intervals)):
-            if i == j:
-                continue
-            b = intervals[j]
-            if a.overlaps_with(b):
-                print(f"{interval_type}: {a.label} and {b.label} overlaps.")
-
-
 # The .csv structure looks like this ["time"], ["producer-service-1_throughput"]....., ["total_throughput"], ["producer-service-1_latency"]....., ["average_latency"]
 
 # The scale of the diagram is based on the maximum value of any dataset.
 # This list is used to calculate the maximum y-value and maximum x-value of any dataset
 # If a different scale is needed, comment the line for the unwanted datasets
 csv_files_data: list[dict] = [
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-1-8-20-Experiment_7.csv"), num_producers=1, color="#fdd1bb", font_color="#000000"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-2-8-20-Experiment_8.csv"), num_producers=2, color="#fba478", font_color="#000000"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-4-8-20-Experiment_9.csv"), num_producers=4, color="#f97634", font_color="#000000"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-8-8-20-Experiment_10.csv"), num_producers=8, color="#e05007", font_color="#ffffff"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-12-8-20-Experiment_11.csv"), num_producers=12, color="#a83c05", font_color="#ffffff"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-16-8-20-Experiment_12.csv"), num_producers=16, color="#702804", font_color="#ffffff"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-1-8-20-Experiment_1.csv"), num_producers=1, color="#b7ebfa", font_color="#000000"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-2-8-20-Experiment_2.csv"), num_producers=2, color="#6ed7f5", font_color="#000000"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-4-8-20-Experiment_3.csv"), num_producers=4, color="#26c3f0", font_color="#000000"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-8-8-20-Experiment_4.csv"), num_producers=8, color="#0D95BC", font_color="#ffffff"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-12-8-20-Experiment_5.csv"), num_producers=12, color="#0a708d", font_color="#ffffff"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-16-8-20-Experiment_6.csv"), num_producers=16, color="#074a5e", font_color="#ffffff"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-1-8-20-Experiment_7.csv"), num_producers=1, color="#fdd1bb", font_color="#000000"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-2-8-20-Experiment_8.csv"), num_producers=2, color="#fba478", font_color="#000000"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-4-8-20-Experiment_9.csv"), num_producers=4, color="#f97634", font_color="#000000"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-8-8-20-Experiment_10.csv"), num_producers=8, color="#e05007", font_color="#ffffff"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-12-8-20-Experiment_11.csv"), num_producers=12, color="#a83c05", font_color="#ffffff"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-16-8-20-Experiment_12.csv"), num_producers=16, color="#702804", font_color="#ffffff"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-1-8-20-Experiment_1.csv"), num_producers=1, color="#b7ebfa", font_color="#000000"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-2-8-20-Experiment_2.csv"), num_producers=2, color="#6ed7f5", font_color="#000000"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-4-8-20-Experiment_3.csv"), num_producers=4, color="#26c3f0", font_color="#000000"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-8-8-20-Experiment_4.csv"), num_producers=8, color="#0D95BC", font_color="#ffffff"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-12-8-20-Experiment_5.csv"), num_producers=12, color="#0a708d", font_color="#ffffff"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-16-8-20-Experiment_6.csv"), num_producers=16, color="#074a5e", font_color="#ffffff"),
 ]
 
 # This list should include all datasets to actually show while the previous list is only used to keep a scale
 csv_files_data_to_show: list[dict] = [
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-1-8-20-Experiment_7.csv"), num_producers=1, color="#fdd1bb", font_color="#000000"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-2-8-20-Experiment_8.csv"), num_producers=2, color="#fba478", font_color="#000000"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-4-8-20-Experiment_9.csv"), num_producers=4, color="#f97634", font_color="#000000"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-8-8-20-Experiment_10.csv"), num_producers=8, color="#e05007", font_color="#ffffff"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-12-8-20-Experiment_11.csv"), num_producers=12, color="#a83c05", font_color="#ffffff"),
-    dict(broker="RabbitMQ", data=pd.read_csv("./data/study/RabbitMQ-16-8-20-Experiment_12.csv"), num_producers=16, color="#702804", font_color="#ffffff"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-1-8-20-Experiment_1.csv"), num_producers=1, color="#b7ebfa", font_color="#000000"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-2-8-20-Experiment_2.csv"), num_producers=2, color="#6ed7f5", font_color="#000000"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-4-8-20-Experiment_3.csv"), num_producers=4, color="#26c3f0", font_color="#000000"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-8-8-20-Experiment_4.csv"), num_producers=8, color="#0D95BC", font_color="#ffffff"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-12-8-20-Experiment_5.csv"), num_producers=12, color="#0a708d", font_color="#ffffff"),
-    dict(broker="Kafka", data=pd.read_csv("./data/study/Kafka-16-8-20-Experiment_6.csv"), num_producers=16, color="#074a5e", font_color="#ffffff"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-1-8-20-Experiment_7.csv"), num_producers=1, color="#fdd1bb", font_color="#000000"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-2-8-20-Experiment_8.csv"), num_producers=2, color="#fba478", font_color="#000000"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-4-8-20-Experiment_9.csv"), num_producers=4, color="#f97634", font_color="#000000"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-8-8-20-Experiment_10.csv"), num_producers=8, color="#e05007", font_color="#ffffff"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-12-8-20-Experiment_11.csv"), num_producers=12, color="#a83c05", font_color="#ffffff"),
+    dict(broker="RabbitMQ", data=load_run("./data/study/RabbitMQ-16-8-20-Experiment_12.csv"), num_producers=16, color="#702804", font_color="#ffffff"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-1-8-20-Experiment_1.csv"), num_producers=1, color="#b7ebfa", font_color="#000000"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-2-8-20-Experiment_2.csv"), num_producers=2, color="#6ed7f5", font_color="#000000"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-4-8-20-Experiment_3.csv"), num_producers=4, color="#26c3f0", font_color="#000000"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-8-8-20-Experiment_4.csv"), num_producers=8, color="#0D95BC", font_color="#ffffff"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-12-8-20-Experiment_5.csv"), num_producers=12, color="#0a708d", font_color="#ffffff"),
+    dict(broker="Kafka", data=load_run("./data/study/Kafka-16-8-20-Experiment_6.csv"), num_producers=16, color="#074a5e", font_color="#ffffff"),
 ]
 
 img_output_folder: str = "./data/study/img/"
-metric: Metric = Metric.Throughput  # The metric to graph from the files
+metric: Metric = Metric.Throughput  # The metric to graph from the files (when not passed with --metrics)
+error_types: list[ErrorType] = [ErrorType.STD, ErrorType.SEM, ErrorType.CI]  # The error types to show in bar graphs (when not passed with --errors)
 remove_tail: int = 20  # The number of values to remove from the beginning of data (producers produce before consumer is ready causing low throughput and high latency in beginning of experiment)
 remove_head: int = 20  # The number of values to remove from head of data
+auto_trim: bool = False  # Detect the warm-up and cool-down of every series (MSER-5) instead of removing remove_tail/remove_head values
+ci_batches: int = 30  # The number of batches used for the batch means confidence intervals of the steady state when auto_trim is true
+streaming: bool = False  # Read the files in chunks keeping only running statistics (constant memory for very long experiments, no line chart)
+chunk_size: int = 100_000  # The number of rows to read at a time when streaming
 fig_width_cm: float = 40.0
 fig_height_cm: float = 20.0
 dpi = 150
 confidence_level: float = 0.95
-
-column: str = "total_throughput" if metric == Metric.Throughput else "average_latency"
-keyword: str = column.replace('_' + metric.value, '').capitalize()
+workers: int = 1  # The number of processes used to load files and render figures (e.g. os.cpu_count()), 1 runs everything in this process
+decimate_lines: bool = True  # Plot only the min and max value per horizontal pixel of long series in line charts (keeps spikes visible)
+profile: bool = False  # Measure the time and peak memory of every stage and file, written to profile.json in the output folder (also with --profile)
+headless: bool = False  # Only save figures without showing them and skip figures whose inputs did not change since they were last rendered
+quantiles: list[float] = [0.5, 0.95, 0.99]  # The latency quantiles to report from the latency sketches
+sketch_accuracy: float = 0.01  # Relative accuracy of the latency quantiles
+scalability_models: list[str] = ["usl", "amdahl"]  # The scalability models fitted to the mean throughput of every broker ("usl" and/or "amdahl")
+scalability_max_producers: int = 32  # Predict the throughput of every broker up to this number of producers in the scalability chart
+outputs: list[str] = ["line", "bar", "anova", "tukey", "quantiles", "scalability", "fairness"]  # Everything that can be emitted for every metric (quantiles and fairness are emitted once)
+default_outputs: list[str] = ["line", "bar", "anova", "tukey", "scalability", "fairness"]  # Emitted when --emit is not passed (quantiles reads every producer latency and throughput, so it is opt-in)
+
+# Every metric, error type and output selected on the command line is emitted from a single load of the files
+parser = argparse.ArgumentParser(description="Compare the throughput/latency of Kafka and RabbitMQ experiments with different numbers of producers")
+parser.add_argument("--metrics", nargs="+", choices=[value.value for value in Metric], default=[metric.value])
+parser.add_argument("--errors", nargs="+", choices=[value.value for value in ErrorType], default=[value.value for value in error_types])
+parser.add_argument("--emit", nargs="+", choices=outputs, default=default_outputs)
+parser.add_argument("--profile", action="store_true", default=profile)
+arguments = parser.parse_args()
+metrics: list[Metric] = [Metric(value) for value in arguments.metrics]
+error_types = [ErrorType(value) for value in arguments.errors]
+emit: list[str] = arguments.emit
+
+if arguments.profile:
+    instrument.enable()
+
+if workers > 1 or headless:
+    plt.switch_backend("Agg")  # Figures are rendered in worker processes or without a display, they can only be saved and not shown
 
 colors: list = []
 font_colors: list = []
 labels: list = []
-data_series: list[Series] = []
-data_series_to_show: list[Series] = []
-
-for csv_file_data in csv_files_data:
-    if remove_head == 0 and remove_tail == 0:
-        data_series.append(csv_file_data["data"][column])
-    elif remove_head == 0 and remove_tail != 0:
-        data_series.append(pd.Series(csv_file_data["data"][column].tolist()[remove_tail:]))
-    elif remove_head != 0 and remove_tail == 0:
-        data_series.append(pd.Series(csv_file_data["data"][column].tolist()[:-remove_head]))
-    else:
-        data_series.append(pd.Series(csv_file_data["data"][column].tolist()[remove_tail:-remove_head]))
-
-
-max_length = max([*map(lambda col: len(col), data_series)])
-max_value = max([*map(lambda col: col.max(), data_series)])
-part_size = max_value / (185 / 5)
-
 for csv_file_data_to_show in csv_files_data_to_show:
     colors.append(csv_file_data_to_show["color"])
     font_colors.append(csv_file_data_to_show["font_color"])
     labels.append(csv_file_data_to_show["broker"] + " " + str(csv_file_data_to_show["num_producers"]))
-    if remove_head == 0 and remove_tail == 0:
-        data_series_to_show.append(csv_file_data_to_show["data"][column])
-    elif remove_head == 0 and remove_tail != 0:
-        data_series_to_show.append(pd.Series(csv_file_data_to_show["data"][column].tolist()[remove_tail:]))
-    elif remove_head != 0 and remove_tail == 0:
-        data_series_to_show.append(pd.Series(csv_file_data_to_show["data"][column].tolist()[:-remove_head]))
+
+
+def metric_column(in_metric: Metric) -> str:
+    return "total_throughput" if in_metric == Metric.Throughput else "average_latency"
+
+
+# The two lists above mostly contain the same files, every file is only opened once and every column only summarised once
+file_names: list[str] = list(dict.fromkeys([csv_file_data["data"].file_name for csv_file_data in csv_files_data + csv_files_data_to_show]))
+file_hashes: list[str] = [source_hash(file_name) for file_name in file_names]
+load_keys: list[tuple] = [(file_name, metric_column(selected_metric)) for selected_metric in metrics for file_name in file_names]
+if auto_trim:
+    cuts: dict[tuple, tuple] = dict(zip(load_keys, run_tasks([(steady_state_cut, key) for key in load_keys], workers)))
+else:
+    cuts = {key: (remove_tail, remove_head) for key in load_keys}  # (remove_tail, remove_head) of every series
+loaded: dict[tuple, tuple] = dict(zip(load_keys, run_tasks([(summarise_column, (*key, *cuts[key], streaming, chunk_size)) for key in load_keys], workers)))
+
+
+def run_cuts(column: str) -> dict[str, tuple]:
+    # (remove_tail, remove_head) of every file for outputs that combine every producer of a run, detected on the total or
+    # average column when auto_trim is true (also when that metric is not graphed)
+    missing: list[tuple] = [(file_name, column) for file_name in file_names if (file_name, column) not in cuts]
+    if auto_trim:
+        cuts.update(zip(missing, run_tasks([(steady_state_cut, key) for key in missing], workers)))
     else:
-        data_series_to_show.append(pd.Series(csv_file_data_to_show["data"][column].tolist()[remove_tail:-remove_head]))
+        cuts.update({key: (remove_tail, remove_head) for key in missing})
+    return {file_name: cuts[(file_name, column)] for file_name in file_names}
+
+
+def line_chart_file() -> str:
+    return f"{img_output_folder}line-{metric.value}.png"
+
+
+def bar_chart_file(error_type: ErrorType) -> str:
+    return f"{img_output_folder}bar-{metric.value}-{error_type.value.lower()}.png"
+
+
+def clusters_file(error_type: ErrorType) -> str:
+    return f"{img_output_folder}clusters-{metric.value}-{error_type.value.lower()}.csv"
+
+
+def tukey_results_file() -> str:
+    return f"{img_output_folder}tukey/tukey-{metric.value}.json"
+
+
+def tukey_chart_file(label: str) -> str:
+    return f"{img_output_folder}tukey/tukey-{metric.value}-{label}.png"
+
+
+def steady_state_file() -> str:
+    return f"{img_output_folder}steady-state-{metric.value}.json"
+
+
+def scalability_results_file() -> str:
+    return f"{img_output_folder}scalability-{metric.value}.json"
+
+
+def scalability_chart_file() -> str:
+    return f"{img_output_folder}scalability-{metric.value}.png"
+
+
+def quantile_chart_file() -> str:
+    return f"{img_output_folder}quantiles-latency.png"
+
+
+def sketches_file() -> str:
+    return f"{img_output_folder}sketches-latency.json"
 
 
 def cm_to_inch(value):
@@ -137,7 +189,9 @@ def generate_line_chart(in_data_series: list[Series]) -> None:
     plt.figure(figsize=(cm_to_inch(fig_width_cm), cm_to_inch(fig_height_cm)))
     for index, _ in enumerate(in_data_series):
         y = in_data_series[index]
-        x = range(1, len(y) + 1)  # First data point at 1 instead of 0
+        x = np.arange(1, len(y) + 1)  # First data point at 1 instead of 0
+        if decimate_lines:
+            x, y = min_max_decimate(x, y, figure_pixels(fig_width_cm, dpi))
         plt.plot(x, y, label=labels[index], linewidth="2", color=colors[index])
 
     plt.xlabel("Message aggregation (#)")
@@ -146,39 +200,21 @@ def generate_line_chart(in_data_series: list[Series]) -> None:
     plt.legend(loc="upper right")
     plt.grid(True)
     plt.ylim(ymin=0, ymax=max_value + part_size)
-    if remove_head == 0 or remove_tail == 0:
+    if auto_trim or remove_head == 0 or remove_tail == 0:
         plt.xlim(xmin=0, xmax=max_length)
     else:
         plt.xlim(xmin=0, xmax=max_length - (remove_head + remove_tail))
-    plt.savefig(f"{img_output_folder}line-{metric}.png", bbox_inches="tight", dpi=dpi)
+    plt.savefig(line_chart_file(), bbox_inches="tight", dpi=dpi)
     plt.show()
+    plt.close()
 
 
-def mean_confidence_interval(data, confidence=0.95) -> tuple:
-    a = 1.0 * np.array(data)
-    n = len(a)
-    m, se = np.mean(a), stats.sem(a)
-    h = se * stats.t.ppf((1 + confidence) / 2., n - 1)
-    return -h, +h
-
-
-def generate_bar_chart(in_data_series: list[Series], error_type: ErrorType = ErrorType.STD) -> None:
+def generate_bar_chart(in_summaries: list[RunningStats], error_type: ErrorType = ErrorType.STD) -> None:
     bar_width: float = 0.9
     font_size: int = 10
 
-    intervals: list[Interval] = []
-    means: list[float] = []
-    stds: list[float] = []
-    sems: list[float] = []
-    cis: list[float] = []
-
-    for series in in_data_series:
-        means.append(series.mean())
-        stds.append(series.std())
-        sems.append(series.sem())
-        cis.append(mean_confidence_interval(series, confidence_level)[1])
-
-    yerr: list[float] = stds if error_type.value == "std" else (sems if error_type.value == "sem" else cis)
+    means: list[float] = [summary.mean for summary in in_summaries]
+    yerr: list[float] = [summary_error(summary, error_type) for summary in in_summaries]
     bars_order: range = range(len(labels))
     interval_capsize: int = 8
 
@@ -190,7 +226,6 @@ def generate_bar_chart(in_data_series: list[Series], error_type: ErrorType = Err
         y_middle = rect.get_y() + rect.get_height() / 2.0
         mean = round(means[index], 2)
         error = round(yerr[index], 2)
-        intervals.append(Interval(mean, error, labels[index]))
 
         if part_size * 2 > y_middle:
             plt.text(x_middle, rect.get_height() + part_size * 3, mean, ha="center", va="center", fontsize=font_size, color="#000000")
@@ -199,22 +234,47 @@ def generate_bar_chart(in_data_series: list[Series], error_type: ErrorType = Err
             plt.text(x_middle, part_size * 3, mean, ha="center", va="center", fontsize=font_size, color=font_colors[index])
             plt.text(x_middle, part_size, "±"+str(error), ha="center", va="center", fontsize=font_size, color=font_colors[index])
 
+    if fits:
+        # Throughput predicted by the USL fit of its broker (with confidence band) on top of every bar
+        for index, csv_file_data_to_show in enumerate(csv_files_data_to_show):
+            fit: dict = fits.get(f"{csv_file_data_to_show['broker']} usl")
+            if fit is None:
+                continue
+            predicted = predict(fit, csv_file_data_to_show["num_producers"])
+            lower, upper = confidence_band(fit, csv_file_data_to_show["num_producers"])
+            plt.errorbar(index, predicted, yerr=[predicted - lower, upper - predicted], marker="D", markersize=5, color="black", capsize=4, linestyle="None",
+                         label="USL fit" if index == 0 else None)
+        plt.legend(loc="upper left")
+
     plt.xticks(range(len(labels)), labels, fontsize=font_size)
 
     plt.ylabel("Throughput (msgs/sec)" if metric == Metric.Throughput else "Latency (ms)")
     plt.xlabel("Broker/number of producers")
     plt.title(f"{keyword} {metric.value} data | Means/{error_type.value.upper()}s Comparison")
     plt.ylim(ymin=0, ymax=max_value + part_size)
-    plt.savefig(f"{img_output_folder}bar-{metric}-{error_type.value.lower()}.png", bbox_inches="tight", dpi=dpi)
+    plt.savefig(bar_chart_file(error_type), bbox_inches="tight", dpi=dpi)
+    plt.show()
+    plt.close()
+
+
+def summary_error(summary: RunningStats, error_type: ErrorType) -> float:
+    if error_type == ErrorType.STD:
+        return summary.std()
+    if error_type == ErrorType.SEM:
+        return summary.sem()
+    return summary.ci(confidence_level)
 
-    compare_intervals(intervals, f"{metric.value.capitalize()}-{error_type.value.upper()}")
 
+def error_intervals(in_summaries: list[RunningStats], error_type: ErrorType) -> list[Interval]:
+    # Rounded the same way as the means and errors shown in the bar chart
+    return [Interval(round(summary.mean, 2), round(summary_error(summary, error_type), 2), labels[index]) for index, summary in enumerate(in_summaries)]
 
-def anova(in_data_series: list[Series]) -> None:
-    if len(in_data_series) < 2:
+
+def anova(in_summaries: list[RunningStats]) -> None:
+    if len(in_summaries) < 2:
         return print("ANOVA test requires at least 2 groups...")
 
-    fvalue, pvalue = stats.f_oneway(*in_data_series)
+    fvalue, pvalue = one_way_anova(in_summaries)
 
     print(f"Results of ANOVA test:\nThe F-statistic is: {str(fvalue)}\n The p-value is: {str(pvalue)}")
 
@@ -224,35 +284,222 @@ def anova(in_data_series: list[Series]) -> None:
         print("No difference in means")
 
 
-def tukey_test(in_data_series: list[Series]) -> None:
-    df: DataFrame = pd.DataFrame()
-
-    if len(in_data_series) < 3:
+def tukey_test(in_summaries: list[RunningStats]) -> None:
+    if len(in_summaries) < 3:
         return print("Tukey test requires at least 3 groups...")
 
-    for index, _ in enumerate(in_data_series):
-        df[labels[index]] = in_data_series[index]
+    tukey_results: dict = tukey_hsd(labels, in_summaries, alpha=(1.0-confidence_level))
+    print(tukey_table(tukey_results))
+    save_tukey(tukey_results, tukey_results_file())  # Every comparison plot can be drawn again from this file
 
-    stacked_data = df.stack().reset_index()
-    stacked_data = stacked_data.rename(columns={"level_1": "groups", 0: "result"})
+    build([(tukey_chart_file(label), figure_key("tukey", label, *figure_inputs), plot_tukey, (tukey_results, label)) for label in labels], workers, headless)
 
-    tukey_results: multi.TukeyHSDResults = multi.pairwise_tukeyhsd(endog=stacked_data["result"], groups=stacked_data["groups"], alpha=(1.0-confidence_level))
-    print(tukey_results.summary())
 
-    grand_mean = stacked_data["result"].values.mean()
+def plot_tukey(tukey_results: dict, label: str) -> None:
     figsize = (cm_to_inch(fig_width_cm), cm_to_inch(fig_height_cm))
     xlabel = "Throughput (msgs/sec)" if metric == Metric.Throughput else "Latency (ms)"
     ylabel = "Broker/producers"
 
-    for label in labels:
-        tukey_results.plot_simultaneous(comparison_name=label, figsize=figsize, xlabel=xlabel, ylabel=ylabel)
-        plt.vlines(x=grand_mean, ymin=-0.5, ymax=len(data_series) - 0.5, color="black", linestyles="dashed")
-        plt.savefig(f"{img_output_folder}tukey/tukey-{metric}-{label}.png", bbox_inches="tight", dpi=dpi)
-        plt.show()
-
-generate_line_chart(data_series_to_show)
-generate_bar_chart(data_series_to_show, ErrorType.STD)
-generate_bar_chart(data_series_to_show, ErrorType.SEM)
-generate_bar_chart(data_series_to_show, ErrorType.CI)
-anova(data_series)
-tukey_test(data_series)
+    plot_simultaneous(tukey_results, comparison_name=label, figsize=figsize, xlabel=xlabel, ylabel=ylabel)
+    plt.vlines(x=tukey_results["grand_mean"], ymin=-0.5, ymax=len(tukey_results["labels"]) - 0.5, color="black", linestyles="dashed")
+    plt.savefig(tukey_chart_file(label), bbox_inches="tight", dpi=dpi)
+    plt.show()
+    plt.close()
+
+
+def steady_state_report(in_data_series: list[Series]) -> None:
+    # The cut points chosen for every series with the mean and batch means confidence interval of what is left
+    steady_states: dict[str, dict] = {}
+    for index, csv_file_data_to_show in enumerate(csv_files_data_to_show):
+        cut: tuple = cuts[(csv_file_data_to_show["data"].file_name, column)]
+        mean: float = summaries_to_show[index].mean
+        halfwidth: float = float("nan") if streaming else batch_means_ci(in_data_series[index], ci_batches, confidence_level)[1]
+        steady_states[labels[index]] = dict(remove_tail=cut[0], remove_head=cut[1], count=summaries_to_show[index].count, mean=mean, ci=halfwidth)
+        print(f"{labels[index]}: removed {cut[0]} values from the beginning and {cut[1]} from the end, mean {round(mean, 2)} ±{round(halfwidth, 2)} (batch means {int(confidence_level * 100)}% CI)")
+    save_steady_states(steady_states, steady_state_file())
+
+
+def scalability_fits(in_summaries: list[RunningStats]) -> dict[str, dict]:
+    # Every model fitted to the mean throughput of the runs of every broker, keyed on "<broker> <model>"
+    results: dict[str, dict] = {}
+    for broker in dict.fromkeys([csv_file_data["broker"] for csv_file_data in csv_files_data]):
+        indices: list[int] = [index for index, csv_file_data in enumerate(csv_files_data) if csv_file_data["broker"] == broker]
+        producers: list[int] = [csv_files_data[index]["num_producers"] for index in indices]
+        for model in scalability_models:
+            if len(set(producers)) <= (2 if model == "usl" else 1):
+                print(f"Fitting {model} for {broker} requires more different numbers of producers...")
+                continue
+            results[f"{broker} {model}"] = fit_scalability(producers, [in_summaries[index].mean for index in indices], model, confidence_level)
+    return results
+
+
+def generate_scalability_chart(in_summaries: list[RunningStats]) -> None:
+    producers = np.linspace(1, scalability_max_producers, 200)
+    linestyles: dict[str, str] = {"usl": "-", "amdahl": "--"}
+
+    plt.figure(figsize=(cm_to_inch(fig_width_cm), cm_to_inch(fig_height_cm)))
+    for broker in dict.fromkeys([csv_file_data["broker"] for csv_file_data in csv_files_data]):
+        indices: list[int] = [index for index, csv_file_data in enumerate(csv_files_data) if csv_file_data["broker"] == broker]
+        color: str = csv_files_data[indices[len(indices) // 2]]["color"]
+        plt.plot([csv_files_data[index]["num_producers"] for index in indices], [in_summaries[index].mean for index in indices],
+                 marker="o", linestyle="None", markersize=8, color=color, markeredgecolor="black", label=f"{broker} measured")
+
+        for model in scalability_models:
+            fit: dict = fits.get(f"{broker} {model}")
+            if fit is None:
+                continue
+            plt.plot(producers, predict(fit, producers), linestyle=linestyles[model], linewidth=2, color=color,
+                     label=f"{broker} {model.upper() if model == 'usl' else model.capitalize()} (σ={fit['sigma']:.4f}, κ={fit['kappa']:.4f})")
+            if model == "usl":
+                lower, upper = confidence_band(fit, producers)
+                plt.fill_between(producers, lower, np.minimum(upper, max_value * 2), color=color, alpha=0.2)
+                if np.isfinite(fit["peak_producers"]):
+                    plt.axvline(fit["peak_producers"], color=color, linestyle=":", linewidth=1)
+                    plt.text(fit["peak_producers"], fit["peak_throughput"], f" peak {fit['peak_producers']:.1f}", color="black", ha="left", va="bottom", fontsize=10)
+
+    plt.xlabel("Number of producers")
+    plt.ylabel("Throughput (msgs/sec)")
+    plt.title(f"{keyword} {metric.value} scalability | {int(confidence_level * 100)}% confidence bands")
+    plt.legend(loc="lower right")
+    plt.grid(True)
+    plt.xlim(xmin=0, xmax=scalability_max_producers)
+    plt.ylim(ymin=0, ymax=max_value * 1.2)
+    plt.savefig(scalability_chart_file(), bbox_inches="tight", dpi=dpi)
+    plt.show()
+    plt.close()
+
+
+def producer_fairness(file_name: str, in_remove_tail: int, in_remove_head: int) -> dict:
+    return fairness(load_long(file_name, Metric.Throughput.value).trim(in_remove_tail, in_remove_head))
+
+
+def fairness_table(in_fairness: list[dict]) -> None:
+    width: int = max(map(len, labels))
+    print(f"{'Fairness':<{width}} {'producers':>9} {'jain':>7} {'jain/sec':>8} {'min share':>9} {'max share':>9}")
+    for label, result in zip(labels, in_fairness):
+        print(f"{label:<{width}} {len(result['producers']):9d} {result['jain']:7.4f} {result['jain_per_second']:8.4f} {result['shares'].min():9.4f} {result['shares'].max():9.4f}")
+
+
+def quantile_label(quantile: float) -> str:
+    return f"p{quantile * 100:g}"
+
+
+def quantile_table(in_sketches: list[LatencySketch], in_labels: list[str]) -> None:
+    width: int = max(map(len, in_labels))
+    print(f"{'Latency (ms)':<{width}} " + " ".join(f"{quantile_label(quantile):>10}" for quantile in quantiles))
+    for label, sketch in zip(in_labels, in_sketches):
+        print(f"{label:<{width}} " + " ".join(f"{value:10.2f}" for value in sketch.quantiles(quantiles)))
+
+
+def generate_quantile_chart(in_sketches: list[LatencySketch]) -> None:
+    bar_width: float = 0.9 / len(quantiles)
+    font_size: int = 10
+    hatches: list[str] = ["", "//", "xx", "..", "\\\\"]
+
+    plt.figure(figsize=(cm_to_inch(fig_width_cm), cm_to_inch(fig_height_cm)))
+    values = [sketch.quantiles(quantiles) for sketch in in_sketches]
+    for quantile_index, quantile in enumerate(quantiles):
+        offsets = [index + (quantile_index - (len(quantiles) - 1) / 2) * bar_width for index in range(len(labels))]
+        plt.bar(offsets, [value[quantile_index] for value in values], edgecolor="black", linewidth=1, width=bar_width, color=colors,
+                hatch=hatches[quantile_index % len(hatches)], label=quantile_label(quantile))
+
+    plt.xticks(range(len(labels)), labels, fontsize=font_size)
+    plt.ylabel("Latency (ms)")
+    plt.xlabel("Broker/number of producers")
+    plt.title(f"Latency quantiles ({', '.join(map(quantile_label, quantiles))}) of every message")
+    plt.legend(loc="upper left")
+    plt.ylim(ymin=0)
+    plt.savefig(quantile_chart_file(), bbox_inches="tight", dpi=dpi)
+    plt.show()
+    plt.close()
+
+
+for metric in metrics:
+    column: str = metric_column(metric)
+    keyword: str = column.replace('_' + metric.value, '').capitalize()
+
+    data_series: list[Series] = []  # Empty when streaming
+    data_series_to_show: list[Series] = []  # Empty when streaming
+    summaries: list[RunningStats] = []  # Count, mean, variance, min and max of every trimmed series in csv_files_data
+    summaries_to_show: list[RunningStats] = []  # Same as above for csv_files_data_to_show
+    for csv_file_data in csv_files_data:
+        series, summary = loaded[(csv_file_data["data"].file_name, column)]
+        if not streaming:
+            data_series.append(series)
+        summaries.append(summary)
+    for csv_file_data_to_show in csv_files_data_to_show:
+        series, summary = loaded[(csv_file_data_to_show["data"].file_name, column)]
+        if not streaming:
+            data_series_to_show.append(series)
+        summaries_to_show.append(summary)
+
+    max_value = max([*map(lambda summary: summary.max, summaries)])
+    part_size = max_value / (185 / 5)
+    if not streaming:
+        max_length = max([*map(lambda col: len(col), data_series)])
+
+    # Throughput models of every broker, drawn over the bar charts (scaling only makes sense for throughput)
+    fits: dict[str, dict] = scalability_fits(summaries) if "scalability" in emit and metric == Metric.Throughput else {}
+
+    # Everything the figures depend on, a figure is only rendered again in headless mode if any of these change
+    # (the scale comes from csv_files_data, which can change without changing the files that are shown)
+    figure_inputs: list = [
+        file_hashes, metric.value, column, remove_tail, remove_head,
+        labels, colors, font_colors, fig_width_cm, fig_height_cm, dpi, confidence_level, decimate_lines, list(fits), auto_trim,
+        max_value, part_size, None if streaming else max_length
+    ]
+
+    if auto_trim:
+        steady_state_report(data_series_to_show)
+
+    charts: list[tuple] = []
+    if "line" in emit and not streaming:
+        charts.append((line_chart_file(), figure_key("line", *figure_inputs), generate_line_chart, (data_series_to_show,)))
+    if "bar" in emit:
+        for error_type in error_types:
+            charts.append((bar_chart_file(error_type), figure_key("bar", error_type.value, *figure_inputs), generate_bar_chart, (summaries_to_show, error_type)))
+    if fits:
+        charts.append((scalability_chart_file(), figure_key("scalability", scalability_models, scalability_max_producers, *figure_inputs), generate_scalability_chart, (summaries,)))
+    build(charts, workers, headless)
+
+    if "bar" in emit:
+        for error_type in error_types:
+            intervals: list[Interval] = error_intervals(summaries_to_show, error_type)
+            compare_intervals(intervals, f"{metric.value.capitalize()}-{error_type.value.upper()}")
+            write_clusters(intervals, clusters_file(error_type))
+    if fits:
+        print(scalability_table(fits))
+        save_scalability(fits, scalability_results_file())
+    if "anova" in emit:
+        anova(summaries)
+    if "tukey" in emit:
+        tukey_test(summaries)
+
+if "quantiles" in emit:
+    # Latency of every message (per producer latency weighted by its throughput) instead of means of per second averages
+    # The sketches saved by an earlier run are reused as long as the files, trims and accuracy did not change
+    latency_cuts: dict[str, tuple] = run_cuts(metric_column(Metric.Latency))
+    sources: list[str] = [csv_file_data_to_show["data"].file_name for csv_file_data_to_show in csv_files_data_to_show]
+    sketches_key: str = figure_key("sketches", file_hashes, sources, labels, remove_tail, remove_head, auto_trim, sketch_accuracy)
+    sketches_to_show: list[LatencySketch] = load_sketches(sketches_file(), sources, sketches_key)
+    if sketches_to_show is None:
+        shown_files: list[str] = list(dict.fromkeys(sources))  # The scale only files are not needed, repeated entries are sketched once
+        sketches: dict[str, LatencySketch] = dict(zip(shown_files, run_tasks([(run_sketch, (file_name, *latency_cuts[file_name], sketch_accuracy)) for file_name in shown_files], workers)))
+        sketches_to_show = [sketches[source] for source in sources]
+        save_sketches(sketches_to_show, labels, sources, sketches_file(), sketches_key)  # Quantiles of any group can be computed again from this file
+
+    brokers: list[str] = list(dict.fromkeys([csv_file_data["broker"] for csv_file_data in csv_files_data_to_show]))
+    broker_sketches: list[LatencySketch] = [merge_sketches([sketches_to_show[index] for index, csv_file_data_to_show in enumerate(csv_files_data_to_show) if csv_file_data_to_show["broker"] == broker]) for broker in brokers]
+    quantile_table(sketches_to_show + broker_sketches, labels + [f"{broker} (all)" for broker in brokers])
+
+    quantile_inputs: list = [file_hashes, remove_tail, remove_head, auto_trim, labels, colors, fig_width_cm, fig_height_cm, dpi, quantiles, sketch_accuracy]
+    build([(quantile_chart_file(), figure_key("quantiles", *quantile_inputs), generate_quantile_chart, (sketches_to_show,))], workers, headless)
+
+if "fairness" in emit:
+    # Share of every producer in the total throughput of a run, from one grouped pass over the per producer values in long format
+    throughput_cuts: dict[str, tuple] = run_cuts(metric_column(Metric.Throughput))
+    fairness_results: dict[str, dict] = dict(zip(file_names, run_tasks([(producer_fairness, (file_name, *throughput_cuts[file_name])) for file_name in file_names], workers)))
+    fairness_table([fairness_results[csv_file_data_to_show["data"].file_name] for csv_file_data_to_show in csv_files_data_to_show])
+
+if arguments.profile:
+    instrument.report(f"{img_output_folder}profile.json")
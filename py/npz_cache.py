@@ -0,0 +1,39 @@
+import hashlib
+import os
+import numpy as np
+
+# Location and lookup of the .npz column caches written by loader, with numpy only.
+# Kept apart from loader (which needs pandas to parse and write caches) so that quick commands can read cached
+# columns without paying for importing pandas.
+
+cache_folder_name: str = ".cache"
+time_column: str = "time"
+
+
+def cache_path(file_name: str) -> str:
+    folder, base_name = os.path.split(os.path.abspath(file_name))
+    return os.path.join(folder, cache_folder_name, os.path.splitext(base_name)[0] + ".npz")
+
+
+def file_hash(file_name: str) -> str:
+    sha1 = hashlib.sha1()
+    with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def cache_matches(file_name: str) -> bool:
+    # The cache was written from the file as it is now (same size and mtime), without hashing the file
+    path = cache_path(file_name)
+    if not os.path.exists(path):
+        return False
+    stat = os.stat(file_name)
+    with np.load(path) as cache:
+        return int(cache["__size__"]) == stat.st_size and int(cache["__mtime_ns__"]) == stat.st_mtime_ns
+
+
+def read_columns(file_name: str, columns: list[str]) -> dict[str, np.ndarray]:
+    """The stored arrays of columns of a cached file (the time column as int64 nanoseconds since the epoch)."""
+    with np.load(cache_path(file_name)) as cache:
+        return {column: cache[column] for column in columns}
@@ -0,0 +1,33 @@
+import contextlib
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import instrument
+
+# Runs independent tasks (loading files, rendering figures) on a pool of processes.
+# The scripts keep their settings and data in module globals, so the workers are forked to inherit them.
+# Where fork is not available (native Windows) the tasks are run one after another in the current process.
+
+
+def _call(task: tuple) -> tuple:
+    function, args = task
+    output = io.StringIO()
+    recorded = len(instrument.records)
+    with contextlib.redirect_stdout(output):
+        result = function(*args)
+    return result, output.getvalue(), instrument.records[recorded:]  # Stages measured in the worker are reported by the main process
+
+
+def run_tasks(tasks: list[tuple], workers: int = 1) -> list:
+    """Runs every (function, args) task and gives the results in task order.
+    Anything a task prints is printed in task order as well, so the output is the same as running the tasks serially."""
+    if workers <= 1 or len(tasks) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [function(*args) for function, args in tasks]
+
+    results: list = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context("fork")) as executor:
+        for result, output, records in executor.map(_call, tasks):
+            print(output, end="")
+            instrument.records.extend(records)
+            results.append(result)
+    return results
@@ -0,0 +1,93 @@
+import json
+import numpy as np
+import scipy.stats as stats
+
+# Scalability models fitted to the mean throughput of runs with different numbers of producers.
+# Universal Scalability Law (Gunther): X(N) = λN / (1 + σ(N - 1) + κN(N - 1)) with contention σ and coherence κ,
+# Amdahl's law is the same model with κ = 0. Both are linear in N / X = 1/λ + σ/λ (N - 1) + κ/λ N(N - 1), so they are
+# fitted with one least squares solve, and the covariance of that solve gives confidence bands for the predicted throughput.
+
+
+def design_matrix(producers: np.ndarray, model: str) -> np.ndarray:
+    producers = np.asarray(producers, dtype=np.float64)
+    columns = [np.ones_like(producers), producers - 1]
+    if model == "usl":
+        columns.append(producers * (producers - 1))
+    return np.stack(columns, axis=1)
+
+
+def fit_scalability(producers, throughputs, model: str = "usl", confidence: float = 0.95) -> dict:
+    """Fits Amdahl's law ("amdahl") or the Universal Scalability Law ("usl") to mean throughputs at producer counts."""
+    if model not in ("amdahl", "usl"):
+        raise ValueError(f"Unknown scalability model {model}")
+    producers = np.asarray(producers, dtype=np.float64)
+    throughputs = np.asarray(throughputs, dtype=np.float64)
+    matrix = design_matrix(producers, model)
+    if len(producers) <= matrix.shape[1]:
+        raise ValueError(f"Fitting {model} requires more than {matrix.shape[1]} producer counts")
+
+    y = producers / throughputs
+    coefficients, _, _, _ = np.linalg.lstsq(matrix, y, rcond=None)
+    residuals = y - matrix @ coefficients
+    df = len(y) - matrix.shape[1]
+    covariance = residuals @ residuals / df * np.linalg.inv(matrix.T @ matrix)
+
+    sigma = coefficients[1] / coefficients[0]
+    kappa = coefficients[2] / coefficients[0] if model == "usl" else 0.0
+    fitted = producers / (matrix @ coefficients)
+    ss_total = ((throughputs - throughputs.mean()) ** 2).sum()
+
+    # The throughput of the USL peaks at N* = sqrt((1 - σ) / κ), Amdahl's law only approaches λ/σ
+    peak_producers = float(np.sqrt((1 - sigma) / kappa)) if kappa > 0 and sigma < 1 else np.inf
+    result = dict(
+        model=model,
+        confidence=confidence,
+        coefficients=coefficients,
+        covariance=covariance,
+        df=df,
+        lambda_=1 / coefficients[0],  # Throughput of a single producer without any contention
+        sigma=sigma,
+        kappa=kappa,
+        r2=1 - ((throughputs - fitted) ** 2).sum() / ss_total if ss_total > 0 else np.nan,
+        peak_producers=peak_producers,
+    )
+    result["peak_throughput"] = float(predict(result, peak_producers)[0]) if np.isfinite(peak_producers) else result["lambda_"] / sigma if sigma > 0 else np.inf
+    return result
+
+
+def predict(result: dict, producers) -> np.ndarray:
+    producers = np.atleast_1d(np.asarray(producers, dtype=np.float64))
+    return producers / (design_matrix(producers, result["model"]) @ result["coefficients"])
+
+
+def confidence_band(result: dict, producers) -> tuple:
+    # Lower and upper bound of the predicted throughput, from the confidence interval of the fitted N / X
+    producers = np.atleast_1d(np.asarray(producers, dtype=np.float64))
+    matrix = design_matrix(producers, result["model"])
+    y = matrix @ result["coefficients"]
+    halfwidth = stats.t.ppf((1 + result["confidence"]) / 2., result["df"]) * np.sqrt(np.einsum("ij,jk,ik->i", matrix, result["covariance"], matrix))
+    with np.errstate(divide="ignore"):
+        upper = np.where(y - halfwidth > 0, producers / (y - halfwidth), np.inf)
+    return producers / (y + halfwidth), upper
+
+
+def scalability_table(results: dict[str, dict]) -> str:
+    width: int = max(len("group"), *map(len, results))
+    lines: list[str] = [f"{'group':<{width}} {'model':>6} {'lambda':>12} {'sigma':>10} {'kappa':>10} {'r2':>7} {'peak N':>8} {'peak X':>12}"]
+    for name, result in results.items():
+        lines.append(
+            f"{name:<{width}} {result['model']:>6} {result['lambda_']:12.2f} {result['sigma']:10.6f} {result['kappa']:10.6f} "
+            f"{result['r2']:7.4f} {result['peak_producers']:8.2f} {result['peak_throughput']:12.2f}"
+        )
+    return "\n".join(lines)
+
+
+def save_scalability(results: dict[str, dict], file_name: str) -> None:
+    with open(file_name, "w") as file:
+        json.dump({name: {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in result.items()} for name, result in results.items()}, file)
+
+
+def load_scalability(file_name: str) -> dict[str, dict]:
+    with open(file_name) as file:
+        results: dict = json.load(file)
+    return {name: {key: np.array(value) if isinstance(value, list) else value for key, value in result.items()} for name, result in results.items()}
@@ -0,0 +1,123 @@
+import json
+import os
+import numpy as np
+from long_format import load_long
+
+# Latency distributions kept as small mergeable histograms with logarithmic buckets (DDSketch style).
+# Every value is counted in the bucket ceil(log_gamma(value)), so any quantile is known within relative_accuracy of the
+# true value while a run only takes a few hundred buckets. Sketches of producers, runs and repetitions are merged by
+# adding the counts of equal buckets, so tail latencies (p95/p99) of any group never need the raw data again.
+# The latency columns hold the average latency of the messages of a second, weighted with the messages of that second.
+# Sketches are built from the per producer values in long format, so only the measured cells are read and no wide
+# column is loaded into the run.
+
+
+class LatencySketch:
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy: float = relative_accuracy
+        self.gamma: float = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.indices: np.ndarray = np.empty(0, dtype=np.int64)  # Sorted bucket indices
+        self.counts: np.ndarray = np.empty(0)  # Weight of every bucket in indices
+        self.zero_count: float = 0.0  # Weight of values <= 0, they have no logarithmic bucket
+
+    @classmethod
+    def from_values(cls, values, weights=None, relative_accuracy: float = 0.01) -> "LatencySketch":
+        sketch = cls(relative_accuracy)
+        sketch.add_values(values, weights)
+        return sketch
+
+    @property
+    def count(self) -> float:
+        return float(self.counts.sum() + self.zero_count)
+
+    def add_values(self, values, weights=None) -> None:
+        # Missing values and values without weight are skipped
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64)
+        keep = ~np.isnan(values) & ~np.isnan(weights) & (weights > 0)
+        values, weights = values[keep], weights[keep]
+
+        positive = values > 0
+        self.zero_count += float(weights[~positive].sum())
+        indices = np.ceil(np.log(values[positive]) / np.log(self.gamma)).astype(np.int64)
+        self._add_buckets(indices, weights[positive])
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        if other.gamma != self.gamma:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        self.zero_count += other.zero_count
+        self._add_buckets(other.indices, other.counts)
+        return self
+
+    def _add_buckets(self, indices: np.ndarray, counts: np.ndarray) -> None:
+        if len(indices) == 0:
+            return
+        indices, inverse = np.unique(np.concatenate([self.indices, indices]), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]), minlength=len(indices))
+        self.indices = indices
+
+    def quantiles(self, qs) -> np.ndarray:
+        qs = np.atleast_1d(np.asarray(qs, dtype=np.float64))
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+
+        # Bucket 0 of the cumulative weights holds the values <= 0, the others the logarithmic buckets in order
+        cumulative = np.cumsum(np.concatenate([[self.zero_count], self.counts]))
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        positions = np.clip(positions, 0, len(cumulative) - 1)
+        values = 2 * self.gamma ** self.indices.astype(np.float64) / (self.gamma + 1)  # Middle of every bucket (relative)
+        return np.where(positions == 0, 0.0, np.concatenate([[0.0], values])[positions])
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def to_dict(self) -> dict:
+        return dict(relative_accuracy=self.relative_accuracy, zero_count=self.zero_count, indices=self.indices.tolist(), counts=self.counts.tolist())
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencySketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.indices = np.array(data["indices"], dtype=np.int64)
+        sketch.counts = np.array(data["counts"], dtype=np.float64)
+        return sketch
+
+
+def merge_sketches(sketches: list[LatencySketch]) -> LatencySketch:
+    merged = LatencySketch(sketches[0].relative_accuracy)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+def run_sketch(file_name: str, remove_tail: int = 0, remove_head: int = 0, relative_accuracy: float = 0.01) -> LatencySketch:
+    """Sketch of the latency of every message of a run, every producer latency is weighted by its throughput of the same second."""
+    latency = load_long(file_name, "latency").trim(remove_tail, remove_head)
+    throughput = load_long(file_name, "throughput").trim(remove_tail, remove_head)
+
+    # Pair the entries of the same producer and second through a key of producer and row (entries are unique per key)
+    throughput_codes = np.array([throughput.producers.index(producer) for producer in latency.producers], dtype=np.int64)
+    latency_keys = throughput_codes[latency.codes] * latency.row_count + latency.rows
+    throughput_keys = throughput.codes.astype(np.int64) * throughput.row_count + throughput.rows
+    _, latency_index, throughput_index = np.intersect1d(latency_keys, throughput_keys, assume_unique=True, return_indices=True)
+    return LatencySketch.from_values(latency.values[latency_index], throughput.values[throughput_index], relative_accuracy)
+
+
+def save_sketches(sketches: list[LatencySketch], labels: list[str], sources: list[str], file_name: str, key: str = "") -> None:
+    # One entry per sketch in order, labels can repeat (repetitions of the same configuration)
+    entries: list[dict] = [dict(label=label, source=source, sketch=sketch.to_dict()) for sketch, label, source in zip(sketches, labels, sources)]
+    with open(file_name, "w") as file:
+        json.dump(dict(key=key, sketches=entries), file)
+
+
+def load_sketches(file_name: str, sources: list[str], key: str = "") -> list[LatencySketch]:
+    # None when there is no file, it was saved from other inputs (the key hashes the source files, trims and accuracy)
+    # or it does not hold one sketch for every source in the same order
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name) as file:
+        data: dict = json.load(file)
+    entries: list = data.get("sketches")
+    if data.get("key") != key or not isinstance(entries, list) or [entry["source"] for entry in entries] != list(sources):
+        return None
+    return [LatencySketch.from_dict(entry["sketch"]) for entry in entries]
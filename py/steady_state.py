@@ -0,0 +1,69 @@
+import json
+import numpy as np
+import scipy.stats as stats
+from loader import load_run
+
+# Detection of the warm-up and cool-down of an experiment instead of removing a fixed number of values.
+# MSER-5 (White et al.): the series is averaged in batches of 5 and the truncation point is the number of batches d
+# (in the first half) that minimises the squared standard error of the mean of the batches that are left,
+# MSER(d) = sum((Y_i - mean(Y_d..k))^2 for i >= d) / (k - d)^2. All truncations are evaluated at once with suffix sums.
+# The cool-down is found the same way on the reversed series that is left after the warm-up.
+
+batch_size: int = 5
+
+
+def mser_truncation(values: np.ndarray) -> int:
+    """The number of values to remove from the beginning of a series according to MSER-5."""
+    batches = len(values) // batch_size
+    if batches < 4:
+        return 0
+    means = values[:batches * batch_size].reshape(batches, batch_size).mean(axis=1)
+    means = means - means.mean()  # Centred to avoid cancellation in the sum of squares below
+
+    # Sums of the batch means from every batch to the end
+    suffix_sum = np.cumsum(means[::-1])[::-1]
+    suffix_squares = np.cumsum((means ** 2)[::-1])[::-1]
+    remaining = batches - np.arange(batches)
+    mser = (suffix_squares - suffix_sum ** 2 / remaining) / remaining ** 2
+    return int(np.argmin(mser[:batches // 2 + 1])) * batch_size
+
+
+def steady_state(values) -> tuple:
+    """The number of values to remove from the beginning (warm-up) and the end (cool-down) of a series.
+    Missing values before the first and after the last measurement (producers that are not running) are always removed."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return len(values), 0
+    first, last = valid[0], valid[-1] + 1
+    measured = values[first:last]
+    measured = np.where(np.isnan(measured), np.nanmean(measured), measured)
+
+    warm_up = mser_truncation(measured)
+    cool_down = mser_truncation(measured[warm_up:][::-1])
+    return int(first + warm_up), int(len(values) - last + cool_down)
+
+
+def steady_state_cut(file_name: str, column: str) -> tuple:
+    # (remove_tail, remove_head) of a column of an experiment file, in the same meaning as the fixed settings of the scripts
+    return steady_state(load_run(file_name).series(column).to_numpy(dtype=np.float64))
+
+
+def batch_means_ci(values, batches: int = 30, confidence: float = 0.95) -> tuple:
+    """Mean and confidence interval half-width from the means of consecutive batches.
+    Values of a second depend on the values before it, the batch means are close to independent unlike the values themselves."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    batches = min(batches, len(values) // 2)
+    if batches < 2:
+        return float(values.mean()) if len(values) else np.nan, np.nan
+    size = len(values) // batches
+    means = values[:batches * size].reshape(batches, size).mean(axis=1)
+    halfwidth = stats.t.ppf((1 + confidence) / 2., batches - 1) * means.std(ddof=1) / np.sqrt(batches)
+    return float(means.mean()), float(halfwidth)
+
+
+def save_steady_states(steady_states: dict[str, dict], file_name: str) -> None:
+    # Chosen cut points and batch means intervals of every series, keyed on label
+    with open(file_name, "w") as file:
+        json.dump(steady_states, file, indent=2)
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+from pandas import Series
+from instrument import stage
+from loader import load_run
+
+# Statistics that can be computed without keeping a measurement series in memory.
+# A series is summarised by its count, mean, sum of squared differences from the mean (Welford), min and max.
+# Summaries of parts of a series can be merged (Chan et al.), so a file can be read in chunks of any size.
+
+
+class RunningStats:
+    def __init__(self):
+        self.count: int = 0
+        self.mean: float = 0.0
+        self.m2: float = 0.0  # Sum of squared differences from the mean
+        self.min: float = np.inf
+        self.max: float = -np.inf
+
+    @classmethod
+    def from_values(cls, values) -> "RunningStats":
+        summary = cls()
+        summary.add_values(values)
+        return summary
+
+    def add(self, value: float) -> None:
+        if np.isnan(value):
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_values(self, values) -> None:
+        # Missing values are skipped just like pandas does when calculating mean/std/sem of a Series
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        chunk = RunningStats()
+        chunk.count = len(values)
+        chunk.mean = float(values.mean())
+        chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        self.merge(chunk)
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def sum(self) -> float:
+        return self.mean * self.count
+
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    def std(self) -> float:
+        return float(np.sqrt(self.variance()))
+
+    def sem(self) -> float:
+        return self.std() / np.sqrt(self.count) if self.count > 0 else np.nan
+
+    def ci(self, confidence: float = 0.95) -> float:
+        # Half-width of the confidence interval around the mean
+        return self.sem() * stats.t.ppf((1 + confidence) / 2., self.count - 1)
+
+
+def one_way_anova(summaries: list[RunningStats]) -> tuple:
+    # One-way ANOVA F-statistic and p-value from summaries, gives the same result as stats.f_oneway on the full series
+    with stage("anova"):
+        return _one_way_anova(summaries)
+
+
+def _one_way_anova(summaries: list[RunningStats]) -> tuple:
+    counts = np.array([summary.count for summary in summaries], dtype=np.float64)
+    means = np.array([summary.mean for summary in summaries])
+    m2s = np.array([summary.m2 for summary in summaries])
+
+    grand_mean = (counts * means).sum() / counts.sum()
+    df_between = len(summaries) - 1
+    df_within = counts.sum() - len(summaries)
+    ss_between = (counts * (means - grand_mean) ** 2).sum()
+    ss_within = m2s.sum()
+
+    fvalue = (ss_between / df_between) / (ss_within / df_within)
+    return fvalue, stats.f.sf(fvalue, df_between, df_within)
+
+
+def trim_series(series: Series, remove_tail: int, remove_head: int) -> Series:
+    # Remove remove_tail values from the beginning and remove_head values from the end, indexed from 0 again
+    return series.iloc[remove_tail:len(series) - remove_head].reset_index(drop=True)
+
+
+def stream_column(file_name: str, column: str, remove_tail: int = 0, remove_head: int = 0, chunk_size: int = 100_000) -> RunningStats:
+    """Summarises a trimmed column of an experiment .csv file while reading it in chunks (constant memory)."""
+    summary = RunningStats()
+    to_skip: int = remove_tail
+    held: np.ndarray = np.empty(0)  # Bounded buffer with the latest remove_head values, counted once newer values push them out
+
+    for chunk in pd.read_csv(file_name, usecols=[column], chunksize=chunk_size):
+        values = chunk[column].to_numpy(dtype=np.float64)
+        if to_skip > 0:
+            skipped = min(to_skip, len(values))
+            values = values[skipped:]
+            to_skip -= skipped
+
+        values = np.concatenate([held, values])
+        ready = max(len(values) - remove_head, 0)
+        summary.add_values(values[:ready])
+        held = values[ready:]
+
+    return summary
+
+
+def summarise_column(file_name: str, column: str, remove_tail: int = 0, remove_head: int = 0, streaming: bool = False, chunk_size: int = 100_000) -> tuple:
+    # The trimmed series (None when streaming) and its summary
+    if streaming:
+        with stage("stream", file_name):
+            return None, stream_column(file_name, column, remove_tail, remove_head, chunk_size)
+    full_series = load_run(file_name).series(column)
+    with stage("trim", file_name):
+        series = trim_series(full_series, remove_tail, remove_head)
+    with stage("summary", file_name):
+        return series, RunningStats.from_values(series)